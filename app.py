@@ -11,7 +11,7 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 
-from libs.cviz_server import CvizServerManager
+from libs.cviz_server import CvizServerManager, DEFAULT_BATCH_MAX_MESSAGES, DEFAULT_BATCH_MAX_DELAY_MS
 
 # Configure logging
 logging.basicConfig(
@@ -20,7 +20,10 @@ logging.basicConfig(
 )
 
 # Create a Cviz server manager instance
-cviz_manager = CvizServerManager()
+cviz_manager = CvizServerManager(
+    batch_max_messages=int(os.environ.get('CVIZ_BATCH_MAX_MESSAGES', DEFAULT_BATCH_MAX_MESSAGES)),
+    batch_max_delay_ms=float(os.environ.get('CVIZ_BATCH_MAX_DELAY_MS', DEFAULT_BATCH_MAX_DELAY_MS)),
+)
 
 
 # Get topics from environment variable
@@ -103,10 +106,13 @@ async def websocket_endpoint(websocket: WebSocket):
             await cviz_manager.handle_client_message(websocket, data)
 
     except WebSocketDisconnect:
-        await cviz_manager.remove_client(websocket)
+        pass
 
     except Exception as e:
         logging.error(f"WebSocket error: {e}")
+
+    finally:
+        # No-op if the sender already dropped (and closed) this client
         await cviz_manager.remove_client(websocket)
 
 
@@ -48,30 +48,35 @@ def main():
     print("🚀 GeoJSON Simulator Started")
     sim_step = 0
 
+    frame_dt = 1. / 30.
+
+    # The boundary never changes, so build and serialize it once
+    boundary_coordinates = [
+        [x_min, y_min],
+        [x_max, y_min],
+        [x_max, y_max],
+        [x_min, y_max],
+        [x_min, y_min]  # Close the boundary
+    ]
+
+    boundary_properties = {
+        "type": "boundary",
+        "color": "#0055ff",
+        "lineWidth": 2
+    }
+
+    boundary_feature = geo.create_linestring_feature(boundary_coordinates, boundary_properties)
+    boundary_payload = linestring_pub.serialize(boundary_feature)
+
     try:
+        # Absolute deadline of the next frame, so work time does not add drift
+        next_tick = time.perf_counter()
         while True:
             # Create a feature collection to hold all geometries for this frame
             feature_collection = geo.create_feature_collection([])
 
-            # 1. Create boundary as a LineString Feature
-            boundary_coordinates = [
-                [x_min, y_min],
-                [x_max, y_min],
-                [x_max, y_max],
-                [x_min, y_max],
-                [x_min, y_min]  # Close the boundary
-            ]
-
-            boundary_properties = {
-                "type": "boundary",
-                "color": "#0055ff",
-                "lineWidth": 2
-            }
-
-            boundary_feature = geo.create_linestring_feature(boundary_coordinates, boundary_properties)
-
-            # Publish boundary as separate LineString
-            linestring_pub.publish(boundary_feature)
+            # 1. Publish the pre-serialized boundary as a separate LineString
+            linestring_pub.publish_raw(boundary_payload)
 
             # Add to feature collection
             feature_collection["features"].append(boundary_feature)
@@ -125,16 +130,16 @@ def main():
 
                 # Warp agents if they go outside the boundaries
                 if x > x_max:
-                    models[i].state[0] = x_min
+                    models[i].x = x_min
                     trajectories[i] = []
                 if y > y_max:
-                    models[i].state[1] = y_min
+                    models[i].y = y_min
                     trajectories[i] = []
                 if x < x_min:
-                    models[i].state[0] = x_max
+                    models[i].x = x_max
                     trajectories[i] = []
                 if y < y_min:
-                    models[i].state[1] = y_max
+                    models[i].y = y_max
                     trajectories[i] = []
 
                 # Create a point for the agent's center
@@ -154,13 +159,12 @@ def main():
             # 4. Generate random observation points (simulating sensor data)
             if sim_step % 3 == 0:  # Only update points every 3 steps
                 # Create points as a MultiPoint feature
-                observation_points = []
-                for j in range(5):  # Create 5 random observation points
-                    observation_points.append(geo.generate_random_point(
-                        center_x=models[0].state[0],
-                        center_y=models[0].state[1],
-                        radius=100
-                    ))
+                observation_points = geo.generate_random_points(  # 5 random observation points
+                    center_x=models[0].x,
+                    center_y=models[0].y,
+                    radius=100,
+                    n=5
+                )
 
                 # Create individual point features for the feature collection
                 points_features = []
@@ -201,7 +205,13 @@ def main():
                 logging.info(f"Simulation step: {sim_step}")
 
             # Control simulation speed
-            time.sleep(1. / 30.)
+            next_tick += frame_dt
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Running behind; restart the schedule instead of bursting to catch up
+                next_tick = time.perf_counter()
             sim_step += 1
 
     except KeyboardInterrupt:
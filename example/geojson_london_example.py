@@ -70,31 +70,36 @@ def main():
     print("🚀 London GeoJSON Simulator Started")
     sim_step = 0
 
+    frame_dt = 1. / 30.
+
+    # The boundary never changes, so build and serialize it once
+    boundary_coordinates = [
+        list(sw_corner),
+        list(se_corner),
+        list(ne_corner),
+        list(nw_corner),
+        list(sw_corner)  # Close the boundary
+    ]
+
+    boundary_properties = {
+        "type": "boundary",
+        "color": "#0055ff",
+        "lineWidth": 2,
+        "description": "Simulation boundary around London"
+    }
+
+    boundary_feature = geo.create_linestring_feature(boundary_coordinates, boundary_properties)
+    boundary_payload = linestring_pub.serialize(boundary_feature)
+
     try:
+        # Absolute deadline of the next frame, so work time does not add drift
+        next_tick = time.perf_counter()
         while True:
             # Create a feature collection to hold all geometries for this frame
             feature_collection = geo.create_feature_collection([])
 
-            # 1. Create boundary as a LineString Feature
-            boundary_coordinates = [
-                list(sw_corner),
-                list(se_corner),
-                list(ne_corner),
-                list(nw_corner),
-                list(sw_corner)  # Close the boundary
-            ]
-
-            boundary_properties = {
-                "type": "boundary",
-                "color": "#0055ff",
-                "lineWidth": 2,
-                "description": "Simulation boundary around London"
-            }
-
-            boundary_feature = geo.create_linestring_feature(boundary_coordinates, boundary_properties)
-
-            # Publish boundary as separate LineString
-            linestring_pub.publish(boundary_feature)
+            # 1. Publish the pre-serialized boundary as a separate LineString
+            linestring_pub.publish_raw(boundary_payload)
 
             # Add to feature collection
             feature_collection["features"].append(boundary_feature)
@@ -161,16 +166,16 @@ def main():
 
                 # Warp agents if they go outside the boundaries (in UTM coordinates)
                 if x > x_max:
-                    models[i].state[0] = x_min
+                    models[i].x = x_min
                     trajectories[i] = []
                 if y > y_max:
-                    models[i].state[1] = y_min
+                    models[i].y = y_min
                     trajectories[i] = []
                 if x < x_min:
-                    models[i].state[0] = x_max
+                    models[i].x = x_max
                     trajectories[i] = []
                 if y < y_min:
-                    models[i].state[1] = y_max
+                    models[i].y = y_max
                     trajectories[i] = []
 
                 # Create a point feature for the agent's center
@@ -191,22 +196,19 @@ def main():
             if sim_step % 3 == 0:  # Only update points every 3 steps
                 # Get first vehicle's position in UTM
                 if models:
-                    vehicle_x, vehicle_y = models[0].state[0], models[0].state[1]
+                    vehicle_x, vehicle_y = models[0].x, models[0].y
                 else:
                     vehicle_x, vehicle_y = x_center, y_center
 
-                # Create points in UTM and convert to lon/lat
-                observation_points = []
-                for j in range(5):  # Create 5 random observation points
-                    # Generate random point in UTM
-                    utm_point = geo.generate_random_point_utm(
-                        center_x=vehicle_x,
-                        center_y=vehicle_y,
-                        radius_m=100  # 100m radius
-                    )
-                    # Convert to lon/lat
-                    lonlat_point = geo.utm_point_to_lonlat(utm_point)
-                    observation_points.append(list(lonlat_point))
+                # Create 5 random points in UTM (100m radius) and convert to lon/lat
+                utm_xs, utm_ys = geo.generate_random_points_utm(
+                    center_x=vehicle_x,
+                    center_y=vehicle_y,
+                    radius_m=100,
+                    n=5
+                )
+                lons, lats = geo.utm_to_lonlat(utm_xs, utm_ys)
+                observation_points = [[lon, lat] for lon, lat in zip(lons.tolist(), lats.tolist())]
 
                 # Create individual point features for the feature collection
                 points_features = []
@@ -249,7 +251,13 @@ def main():
                 logging.info(f"London simulation step: {sim_step}")
 
             # Control simulation speed
-            time.sleep(1. / 30.)
+            next_tick += frame_dt
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Running behind; restart the schedule instead of bursting to catch up
+                next_tick = time.perf_counter()
             sim_step += 1
 
     except KeyboardInterrupt:
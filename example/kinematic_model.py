@@ -1,4 +1,4 @@
-import numpy as np
+import math
 
 class KinematicBicycleModel:
     def __init__(self, x=0, y=0, yaw=0, v=0,
@@ -13,8 +13,12 @@ class KinematicBicycleModel:
         self.lr = lr
         self.dt = dt
         
-        # Initial state (x, y, yaw, velocity)
-        self.state = np.array([x, y, yaw, v]) 
+        # Initial state (x, y, yaw, velocity) as plain floats, since NumPy
+        # dispatch costs far more than the arithmetic on four scalars
+        self.x = float(x)
+        self.y = float(y)
+        self.theta = float(yaw)
+        self.v = float(v)
 
     def update(self, acceleration, steering_angle):
         """
@@ -22,18 +26,18 @@ class KinematicBicycleModel:
         :param acceleration: Acceleration input (m/s²)
         :param steering_angle: Steering angle input (radians)
         """
-        x, y, theta, v = self.state
-        beta = np.arctan((self.lr / self.L) * np.tan(steering_angle))
+        x, y, theta, v = self.x, self.y, self.theta, self.v
+        beta = math.atan((self.lr / self.L) * math.tan(steering_angle))
         
         # Update state using the kinematic equations
-        x += v * np.cos(theta + beta) * self.dt
-        y += v * np.sin(theta + beta) * self.dt
-        theta += (v / self.L) * np.sin(beta) * self.dt
+        x += v * math.cos(theta + beta) * self.dt
+        y += v * math.sin(theta + beta) * self.dt
+        theta += (v / self.L) * math.sin(beta) * self.dt
         v += acceleration * self.dt
 
         # Save new state
-        self.state = np.array([x, y, theta, v])
+        self.x, self.y, self.theta, self.v = x, y, theta, v
 
     def get_state(self):
-        """Return the current state."""
-        return self.state.copy()
\ No newline at end of file
+        """Return the current state as (x, y, yaw, velocity)."""
+        return (self.x, self.y, self.theta, self.v)
\ No newline at end of file
@@ -185,6 +185,8 @@ def main():
     logging.info("Starting OSM road network simulation")
 
     try:
+        # Absolute deadline of the next update, so work time does not add drift
+        next_tick = time.perf_counter()
         while True:
             point_features = []
             trail_features = []
@@ -203,7 +205,13 @@ def main():
             if trail_features:
                 trail_pub.publish(geo.create_feature_collection(trail_features))
 
-            time.sleep(UPDATE_DT)
+            next_tick += UPDATE_DT
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Running behind; restart the schedule instead of bursting to catch up
+                next_tick = time.perf_counter()
 
     except KeyboardInterrupt:
         logging.info("Stopping OSM road network simulation")
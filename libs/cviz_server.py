@@ -1,14 +1,39 @@
 import os
 import time
+import struct
 import logging
 import asyncio
 from collections import defaultdict
-import json
 
+import orjson
 from fastapi import WebSocket
 
 from libs.subscriber import Subscriber
 
+# Optional: MessagePack output for clients that ask for it
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Received messages waiting for the broadcast task before the oldest are dropped
+INBOX_SIZE = 10000
+
+# Messages queued per client before new ones are dropped for that client
+CLIENT_QUEUE_SIZE = 64
+
+# Messages arriving within this window (up to a batch limit) are sent to a
+# client as one JSON array
+DEFAULT_BATCH_MAX_DELAY_MS = 2
+DEFAULT_BATCH_MAX_MESSAGES = CLIENT_QUEUE_SIZE
+
+# Wire formats a client can select with the "set_format" action
+WIRE_FORMATS = ('json', 'msgpack')
+
+# Checks that a forwarded payload is valid JSON; decoding into Raw validates
+# the text without building Python objects (ValueError on failure)
+validate_json = msgspec.json.Decoder(msgspec.Raw).decode if msgspec else orjson.loads
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -16,13 +41,64 @@ logging.basicConfig(
 )
 
 
+class OutgoingMessage:
+    """A received message, shared by every client queue it is delivered to.
+
+    The MessagePack form is encoded on first use, so a message is transcoded
+    at most once however many MessagePack clients receive it.
+    """
+
+    __slots__ = ('text', '_packed')
+
+    def __init__(self, text: str):
+        self.text = text
+        self._packed = None
+
+    @property
+    def packed(self):
+        """MessagePack bytes, or None if the message cannot be transcoded."""
+        if self._packed is None:
+            try:
+                self._packed = msgspec.msgpack.encode(msgspec.json.decode(self.text))
+            except (msgspec.MsgspecError, ValueError, OverflowError) as e:
+                # A bad message only skips itself; remember the failure so it is logged once
+                logging.warning(f"Cannot transcode message to MessagePack: {e}")
+                self._packed = False
+        return self._packed or None
+
+
+def json_array(messages) -> str:
+    """Join JSON messages into one JSON array text."""
+    return '[' + ','.join(messages) + ']'
+
+
+def msgpack_array(items) -> bytes:
+    """Join already-encoded MessagePack items into one MessagePack array."""
+    n = len(items)
+    if n < 16:
+        header = bytes((0x90 | n,))
+    elif n < 0x10000:
+        header = struct.pack('>BH', 0xdc, n)
+    else:
+        header = struct.pack('>BI', 0xdd, n)
+    return header + b''.join(items)
+
+
 class CvizServerManager:
     """Manages WebSocket connections and ZMQ subscriptions for Cviz"""
 
-    def __init__(self, zmq_endpoint=None):
+    def __init__(self, zmq_endpoint=None,
+                 batch_max_messages=DEFAULT_BATCH_MAX_MESSAGES,
+                 batch_max_delay_ms=DEFAULT_BATCH_MAX_DELAY_MS):
         self.clients = set()
+        self.client_queues = {}
+        self.client_senders = {}
+        self.msgpack_clients = set()  # clients that receive binary MessagePack frames
         self.client_topics = {}
         self.topic_clients = defaultdict(set)
+        # Per-topic tuple of subscribed clients' queues, rebuilt only when
+        # subscriptions change so broadcasting iterates a stable snapshot
+        self.topic_queues = {}
         self.subscribers = {}
         self.subscriber_tasks = {}
         self.static_topics = set()
@@ -31,7 +107,11 @@ class CvizServerManager:
         self.task = None
         self.zmq_endpoint = zmq_endpoint or os.environ.get("CVIZ_ZMQ_ENDPOINT", "tcp://127.0.0.1:5555")
 
-        # Message cache to store the latest message for each topic
+        # Coalescing of queued messages into one websocket frame per client
+        self.batch_max_messages = max(1, batch_max_messages)
+        self.batch_delay = batch_max_delay_ms / 1000.0
+
+        # Message cache to store the latest message (as an OutgoingMessage) for each topic
         # This ensures new clients can receive the current state immediately
         self.message_cache = {}
 
@@ -39,6 +119,10 @@ class CvizServerManager:
         self.geometry_history = defaultdict(list)
         self.history_limits = defaultdict(lambda: 1)  # Default to keep only the latest message
 
+        # Subscribers push (topic, message) here as messages arrive, so the
+        # broadcast task wakes up on delivery instead of polling
+        self.inbox = asyncio.Queue(maxsize=INBOX_SIZE)
+
     def add_subscriber(self, topic_name, history_limit=1, permanent=False):
         """Add a new subscriber with optional history retention."""
         if topic_name in self.subscribers:
@@ -47,7 +131,9 @@ class CvizServerManager:
                 self.static_topics.add(topic_name)
             return self.subscribers[topic_name]
 
-        new_sub = Subscriber(topic_name=topic_name, zmq_endpoint=self.zmq_endpoint)
+        # Payloads are forwarded verbatim (only validated in _on_message), so skip parsing them
+        new_sub = Subscriber(topic_name=topic_name, zmq_endpoint=self.zmq_endpoint, raw=True,
+                             on_message=self._on_message)
         self.subscribers[topic_name] = new_sub
         self.history_limits[topic_name] = history_limit
         if permanent:
@@ -70,23 +156,93 @@ class CvizServerManager:
 
         return subscriber
 
+    def _on_message(self, topic, message):
+        """Queue a message received by a subscriber for broadcasting."""
+        # Payloads are forwarded verbatim and batched into JSON arrays, so one
+        # malformed payload would make clients reject every message sent with it
+        try:
+            validate_json(message)
+        except ValueError as e:
+            logging.warning(f"Dropping invalid JSON message on topic {topic}: {e}")
+            return
+        if not message.lstrip().startswith('{'):
+            # A top-level array would be unpacked by clients as a batch
+            logging.warning(f"Dropping non-object JSON message on topic {topic}")
+            return
+
+        try:
+            self.inbox.put_nowait((topic, message))
+        except asyncio.QueueFull:
+            # Broadcasting has fallen behind; the newest state matters most, so drop the oldest
+            self.inbox.get_nowait()
+            self.inbox.put_nowait((topic, message))
+            logging.debug("Broadcast inbox full; dropped oldest message")
+
     async def register_client(self, websocket: WebSocket):
         """Register a new WebSocket client and send cached data"""
         await websocket.accept()
         self.clients.add(websocket)
         self.client_topics[websocket] = set()
+
+        # Each client gets its own bounded queue and sender task so a slow
+        # client cannot hold up delivery to the others
+        queue = self.client_queues[websocket] = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.client_senders[websocket] = asyncio.create_task(self._send_to_client(websocket, queue))
         logging.info(f"New WebSocket client connected. Total: {len(self.clients)}")
 
+    async def _send_to_client(self, websocket: WebSocket, queue: asyncio.Queue):
+        """Send queued messages to a single client until it disconnects."""
+        try:
+            while True:
+                batch = [await queue.get()]
+
+                # Give the rest of a publisher frame a moment to arrive, then
+                # send everything queued (up to the batch limit) in one frame
+                if self.batch_delay > 0:
+                    await asyncio.sleep(self.batch_delay)
+                while len(batch) < self.batch_max_messages and not queue.empty():
+                    batch.append(queue.get_nowait())
+
+                if websocket in self.msgpack_clients:
+                    items = [packed for packed in (message.packed for message in batch) if packed is not None]
+                    if items:
+                        await websocket.send_bytes(items[0] if len(items) == 1 else msgpack_array(items))
+                elif len(batch) == 1:
+                    await websocket.send_text(batch[0].text)
+                else:
+                    await websocket.send_text(json_array([message.text for message in batch]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Error sending to client: {e}")
+
+        # Close the socket so the endpoint's receive loop ends too, instead of
+        # keeping an unregistered connection open
+        try:
+            await websocket.close()
+        except Exception:
+            # Already closed by the other side
+            pass
+
+        # The client is gone; drop it without cancelling this (finishing) task
+        self.client_senders.pop(websocket, None)
+        await self.remove_client(websocket)
+
     async def send_cached_messages_for_topic(self, websocket: WebSocket, topic: str):
         """Send cached messages for a specific topic to a client."""
+        queue = self.client_queues.get(websocket)
+        if queue is None:
+            return
+
         try:
+            # Go through the client's queue to keep ordering with live messages
             if topic in self.message_cache:
                 logging.info(f"Sending cached message for topic: {topic}")
-                await websocket.send_text(json.dumps(self.message_cache[topic]))
+                await queue.put(self.message_cache[topic])
 
             if topic in self.geometry_history:
                 for message in self.geometry_history[topic]:
-                    await websocket.send_text(json.dumps(message))
+                    await queue.put(message)
         except Exception as e:
             logging.error(f"Error sending cached messages for topic {topic}: {e}")
 
@@ -106,6 +262,7 @@ class CvizServerManager:
             if topic not in client_topic_set:
                 client_topic_set.add(topic)
                 self.topic_clients[topic].add(websocket)
+                self._refresh_topic_queues(topic)
                 await self.send_cached_messages_for_topic(websocket, topic)
 
     async def unsubscribe_client_from_topics(self, websocket: WebSocket, topics):
@@ -121,8 +278,18 @@ class CvizServerManager:
             client_topic_set.remove(topic)
             if topic in self.topic_clients:
                 self.topic_clients[topic].discard(websocket)
+                self._refresh_topic_queues(topic)
             await self._cleanup_topic_if_unused(topic)
 
+    def _refresh_topic_queues(self, topic: str):
+        """Rebuild the snapshot of send queues for the clients of a topic."""
+        queues = tuple(self.client_queues[client] for client in self.topic_clients[topic]
+                       if client in self.client_queues)
+        if queues:
+            self.topic_queues[topic] = queues
+        else:
+            self.topic_queues.pop(topic, None)
+
     async def _cleanup_topic_if_unused(self, topic: str):
         """Stop tracking a topic if no clients are listening and it's not permanent."""
         if topic in self.static_topics:
@@ -140,17 +307,20 @@ class CvizServerManager:
             except asyncio.CancelledError:
                 pass
 
-        self.subscribers.pop(topic, None)
+        subscriber = self.subscribers.pop(topic, None)
+        if subscriber is not None:
+            subscriber.close()
         self.history_limits.pop(topic, None)
         self.geometry_history.pop(topic, None)
         self.message_cache.pop(topic, None)
         self.topic_clients.pop(topic, None)
+        self.topic_queues.pop(topic, None)
 
     async def handle_client_message(self, websocket: WebSocket, message_text: str):
         """Process subscription commands sent by a client."""
         try:
-            payload = json.loads(message_text)
-        except json.JSONDecodeError:
+            payload = orjson.loads(message_text)
+        except orjson.JSONDecodeError:
             logging.warning("Received invalid JSON from client")
             return
 
@@ -168,6 +338,8 @@ class CvizServerManager:
             await self.subscribe_client_to_topics(websocket, topics, history_limit=history_limit)
         elif action == "unsubscribe":
             await self.unsubscribe_client_from_topics(websocket, topics)
+        elif action == "set_format":
+            self.set_client_format(websocket, payload.get("format", "json"))
         elif action == "set_topics":
             # Replace client's subscriptions with the provided list
             existing = list(self.client_topics.get(websocket, set()))
@@ -176,21 +348,38 @@ class CvizServerManager:
         else:
             logging.warning(f"Unknown client action: {action}")
 
+    def set_client_format(self, websocket: WebSocket, wire_format: str):
+        """Choose whether a client receives JSON text or MessagePack binary frames."""
+        if wire_format not in WIRE_FORMATS:
+            logging.warning(f"Unknown wire format requested: {wire_format}")
+            return
+        if wire_format == 'msgpack':
+            if msgspec is None:
+                logging.warning("MessagePack requested but msgspec is not installed; keeping JSON")
+                return
+            self.msgpack_clients.add(websocket)
+        else:
+            self.msgpack_clients.discard(websocket)
+
     def get_active_topics(self):
         """Return topics that have delivered at least one message."""
         return set(self.message_cache.keys())
 
     async def remove_client(self, websocket: WebSocket):
-        """Remove a WebSocket client"""
+        """Remove a WebSocket client; removing it again is a no-op."""
         if websocket in self.clients:
             topics = list(self.client_topics.get(websocket, set()))
             if topics:
                 await self.unsubscribe_client_from_topics(websocket, topics)
             self.client_topics.pop(websocket, None)
+            self.client_queues.pop(websocket, None)
+            self.msgpack_clients.discard(websocket)
             self.clients.remove(websocket)
+
+            sender = self.client_senders.pop(websocket, None)
+            if sender:
+                sender.cancel()
             logging.info(f"Client disconnected. Remaining: {len(self.clients)}")
-        else:
-            logging.warning(f"Attempted to remove a client that wasn't registered")
 
     async def broadcast_messages(self):
         """Send messages from subscribers to all connected WebSocket clients"""
@@ -198,45 +387,45 @@ class CvizServerManager:
 
         try:
             while self.running:
-                for topic, subscriber in self.subscribers.items():
-                    self.last_time[topic] = time.time()
-                    message = subscriber.get_message()
-
-                    if message is not None:
-                        logging.debug(f"Received message for topic: {topic}")
-                        websocket_message = json.dumps(message)
-
-                        # Store in cache for new clients
-                        self.message_cache[topic] = message
-
-                        # Store in history for topics with history enabled
-                        if self.history_limits[topic] > 1:
-                            self.geometry_history[topic].append(message)
-                            # Maintain history limit
-                            while len(self.geometry_history[topic]) > self.history_limits[topic]:
-                                self.geometry_history[topic].pop(0)
-
-                        interested_clients = self.topic_clients.get(topic, set())
-
-                        if interested_clients:
-                            logging.info(f"Broadcasting topic: {topic} to {len(interested_clients)} clients")
-
-                            disconnected_clients = set()
-                            for client in interested_clients.copy():
-                                try:
-                                    await client.send_text(websocket_message)
-                                except Exception as e:
-                                    logging.error(f"Error sending to client: {e}")
-                                    disconnected_clients.add(client)
-
-                            # Remove any disconnected clients
-                            for client in disconnected_clients:
-                                await self.remove_client(client)
-                        else:
-                            logging.debug(f"No clients subscribed to topic: {topic}. Caching message.")
-
-                # Yield control to allow other async operations
-                await asyncio.sleep(0.01)
+                topic, text = await self.inbox.get()
+                if topic not in self.subscribers:
+                    # Topic was dropped while the message was queued
+                    continue
+
+                # One object per received message is shared by the cache and every
+                # client queue, so its encodings are built once for all of them
+                message = OutgoingMessage(text)
+
+                self.last_time[topic] = time.time()
+                logging.debug("Received message for topic: %s", topic)
+
+                # Store in cache for new clients
+                self.message_cache[topic] = message
+
+                # Store in history for topics with history enabled
+                if self.history_limits[topic] > 1:
+                    self.geometry_history[topic].append(message)
+                    # Maintain history limit
+                    while len(self.geometry_history[topic]) > self.history_limits[topic]:
+                        self.geometry_history[topic].pop(0)
+
+                queues = self.topic_queues.get(topic)
+                if not queues:
+                    logging.debug("No clients subscribed to topic: %s. Caching message.", topic)
+                    continue
+
+                logging.debug("Broadcasting topic: %s to %d clients", topic, len(queues))
+
+                # Hand the message to each client's sender; nothing here awaits
+                for queue in queues:
+                    try:
+                        queue.put_nowait(message)
+                    except asyncio.QueueFull:
+                        # Client is not keeping up; drop its oldest pending message
+                        # rather than stall everyone, so it catches up on fresh data
+                        logging.debug("Dropping message on topic %s for slow client", topic)
+                        queue.get_nowait()
+                        queue.put_nowait(message)
 
         except Exception as e:
             logging.error(f"Error in broadcast task: {e}")
@@ -263,18 +452,14 @@ class CvizServerManager:
         """Stop all running tasks"""
         self.running = False
 
-        # Cancel subscriber tasks
-        for task in list(self.subscriber_tasks.values()):
+        # Cancel every task first, then wait for all of them together so none
+        # is left running (and holding a socket) if another fails to stop
+        tasks = [*self.subscriber_tasks.values(), *self.client_senders.values()]
+        if self.task:
+            tasks.append(self.task)
+        for task in tasks:
             task.cancel()
-            try:
-                await task
-            except asyncio.CancelledError:
-                pass
         self.subscriber_tasks.clear()
+        self.client_senders.clear()
 
-        if self.task:
-            self.task.cancel()
-            try:
-                await self.task
-            except asyncio.CancelledError:
-                pass
+        await asyncio.gather(*tasks, return_exceptions=True)
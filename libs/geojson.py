@@ -1,6 +1,7 @@
 import random
 import math
 from functools import lru_cache
+import numpy as np
 from pyproj import Transformer, CRS
 
 # Default EPSG codes for coordinate systems
@@ -11,6 +12,9 @@ DEFAULT_TARGET_EPSG = 32630  # UTM zone 30N (meters)
 _source_epsg = DEFAULT_SOURCE_EPSG
 _target_epsg = DEFAULT_TARGET_EPSG
 
+# Shared generator for vectorised random geometry
+_rng = np.random.default_rng()
+
 
 def set_epsg(source_epsg=None, target_epsg=None):
     """
@@ -31,9 +35,6 @@ def set_epsg(source_epsg=None, target_epsg=None):
     if target_epsg is not None:
         _target_epsg = target_epsg
 
-    # Clear the transformer cache when changing settings
-    _get_transformers.cache_clear()
-
     return {
         "source_epsg": _source_epsg,
         "target_epsg": _target_epsg
@@ -60,8 +61,8 @@ def get_epsg_info():
     Returns:
         dict: Information about the current coordinate systems
     """
-    source_crs = CRS.from_epsg(_source_epsg)
-    target_crs = CRS.from_epsg(_target_epsg)
+    source_crs = _get_crs(_source_epsg)
+    target_crs = _get_crs(_target_epsg)
 
     return {
         "source": {
@@ -121,23 +122,32 @@ def get_utm_epsg_for_location(lon, lat):
         return 32700 + zone
 
 
-# Cache the transformers for better performance
-@lru_cache(maxsize=8)
-def _get_transformers(source_epsg=None, target_epsg=None):
-    """Get cached coordinate transformers for the given EPSG codes."""
-    # Use global configuration if no specific codes provided
-    source_epsg = source_epsg or _source_epsg
-    target_epsg = target_epsg or _target_epsg
+# Cache the CRS objects and transformers for better performance
+@lru_cache(maxsize=64)
+def _get_crs(epsg):
+    """Get a cached CRS for the given EPSG code."""
+    return CRS.from_epsg(epsg)
 
-    source_crs = CRS.from_epsg(source_epsg)
-    target_crs = CRS.from_epsg(target_epsg)
 
+@lru_cache(maxsize=64)
+def _make_transformers(source_epsg, target_epsg):
+    """Build the forward and inverse transformers for a concrete EPSG pair."""
+    # Reuse the cached CRS objects; from_crs would otherwise resolve each code again
+    source_crs = _get_crs(source_epsg)
+    target_crs = _get_crs(target_epsg)
     to_target = Transformer.from_crs(source_crs, target_crs, always_xy=True)
     to_source = Transformer.from_crs(target_crs, source_crs, always_xy=True)
 
     return to_target, to_source
 
 
+def _get_transformers(source_epsg=None, target_epsg=None):
+    """Get cached coordinate transformers for the given EPSG codes."""
+    # Resolve the global configuration before the cache lookup so that
+    # explicit and default codes for the same pair share one entry
+    return _make_transformers(source_epsg or _source_epsg, target_epsg or _target_epsg)
+
+
 # Coordinate transformation functions
 def lonlat_to_utm(lon, lat, source_epsg=None, target_epsg=None):
     """Convert WGS84 (longitude, latitude) to UTM coordinates (meters)."""
@@ -160,7 +170,7 @@ def create_feature(geometry_type, coordinates, properties=None):
             "type": geometry_type,
             "coordinates": coordinates
         },
-        "properties": properties or {}
+        "properties": properties if properties is not None else {}
     }
 
 
@@ -188,7 +198,7 @@ def create_polygon_feature(coords, properties=None):
     """Create a GeoJSON Polygon feature."""
     # Ensure the polygon is closed (first point = last point)
     if coords[0] != coords[-1]:
-        coords.append(coords[0])
+        coords = [*coords, list(coords[0])]
 
     # In GeoJSON, polygon coordinates are an array of linear rings
     # The first ring is the exterior, any subsequent rings are holes
@@ -199,7 +209,7 @@ def create_polygon_with_holes_feature(exterior, holes=None, properties=None):
     """Create a GeoJSON Polygon feature with holes."""
     # Ensure the exterior ring is closed
     if exterior[0] != exterior[-1]:
-        exterior.append(exterior[0])
+        exterior = [*exterior, list(exterior[0])]
 
     # Create the coordinate array with the exterior ring first
     polygon_coords = [exterior]
@@ -209,7 +219,7 @@ def create_polygon_with_holes_feature(exterior, holes=None, properties=None):
         for hole in holes:
             # Ensure each hole is closed
             if hole[0] != hole[-1]:
-                hole.append(hole[0])
+                hole = [*hole, list(hole[0])]
             polygon_coords.append(hole)
 
     return create_feature("Polygon", polygon_coords, properties)
@@ -225,13 +235,13 @@ def create_multipolygon_feature(polygons, properties=None):
         if all(isinstance(coord, (int, float)) for coord in polygon[0]):
             # Ensure it's closed
             if polygon[0] != polygon[-1]:
-                polygon.append(polygon[0])
+                polygon = [*polygon, list(polygon[0])]
             formatted_polygons.append([polygon])
         else:
             # This is already an array of rings
             exterior = polygon[0]
             if exterior[0] != exterior[-1]:
-                exterior.append(exterior[0])
+                exterior = [*exterior, list(exterior[0])]
 
             rings = [exterior]
 
@@ -239,7 +249,7 @@ def create_multipolygon_feature(polygons, properties=None):
             for i in range(1, len(polygon)):
                 hole = polygon[i]
                 if hole[0] != hole[-1]:
-                    hole.append(hole[0])
+                    hole = [*hole, list(hole[0])]
                 rings.append(hole)
 
             formatted_polygons.append(rings)
@@ -259,7 +269,7 @@ def create_geometry_collection_feature(geometries, properties=None):
     return {
         "type": "Feature",
         "geometry": geometry_collection,
-        "properties": properties or {}
+        "properties": properties if properties is not None else {}
     }
 
 
@@ -274,13 +284,18 @@ def create_feature_collection(features):
 # Geometry generation functions
 def generate_rectangle_coordinates(center_x=300, center_y=300, w=100, h=100, yaw=0):
     """Generate a rectangle polygon as GeoJSON coordinates array."""
+    # Rotate the half extents once instead of re-evaluating the trig per corner
+    c, s = math.cos(yaw), math.sin(yaw)
+    wc, ws, hc, hs = w * c, w * s, h * c, h * s
+
+    first = [center_x + wc - hs, center_y + ws + hc]
     coords = [
-        [center_x + w * math.cos(yaw) - h * math.sin(yaw), center_y + w * math.sin(yaw) + h * math.cos(yaw)],
-        [center_x - w * math.cos(yaw) - h * math.sin(yaw), center_y - w * math.sin(yaw) + h * math.cos(yaw)],
-        [center_x - w * math.cos(yaw) + h * math.sin(yaw), center_y - w * math.sin(yaw) - h * math.cos(yaw)],
-        [center_x + w * math.cos(yaw) + h * math.sin(yaw), center_y + w * math.sin(yaw) - h * math.cos(yaw)],
-        # Close the ring by repeating the first point
-        [center_x + w * math.cos(yaw) - h * math.sin(yaw), center_y + w * math.sin(yaw) + h * math.cos(yaw)]
+        first,
+        [center_x - wc - hs, center_y - ws + hc],
+        [center_x - wc + hs, center_y - ws - hc],
+        [center_x + wc + hs, center_y + ws - hc],
+        # Close the ring with a copy so editing one vertex can't move the other
+        list(first)
     ]
 
     return coords
@@ -289,7 +304,7 @@ def generate_rectangle_coordinates(center_x=300, center_y=300, w=100, h=100, yaw
 def generate_random_point(center_x=300, center_y=300, radius=30):
     """Generate a random point near a center with specified radius."""
     angle = random.uniform(0, 2 * math.pi)
-    distance = random.uniform(0, radius)
+    distance = radius * math.sqrt(random.random())
 
     x = center_x + distance * math.cos(angle)
     y = center_y + distance * math.sin(angle)
@@ -299,48 +314,38 @@ def generate_random_point(center_x=300, center_y=300, radius=30):
 
 def generate_rectangle_coordinates_utm(center_x, center_y, width_m, height_m, yaw=0):
     """Generate a rectangle polygon in UTM coordinates (meters)."""
+    c, s = math.cos(yaw), math.sin(yaw)
+    wc, ws, hc, hs = width_m * c, width_m * s, height_m * c, height_m * s
+
     points = [
-        [
-            center_x + width_m * math.cos(yaw) - height_m * math.sin(yaw),
-            center_y + width_m * math.sin(yaw) + height_m * math.cos(yaw)
-        ],
-        [
-            center_x - width_m * math.cos(yaw) - height_m * math.sin(yaw),
-            center_y - width_m * math.sin(yaw) + height_m * math.cos(yaw)
-        ],
-        [
-            center_x - width_m * math.cos(yaw) + height_m * math.sin(yaw),
-            center_y - width_m * math.sin(yaw) - height_m * math.cos(yaw)
-        ],
-        [
-            center_x + width_m * math.cos(yaw) + height_m * math.sin(yaw),
-            center_y + width_m * math.sin(yaw) - height_m * math.cos(yaw)
-        ]
+        [center_x + wc - hs, center_y + ws + hc],
+        [center_x - wc - hs, center_y - ws + hc],
+        [center_x - wc + hs, center_y - ws - hc],
+        [center_x + wc + hs, center_y + ws - hc]
     ]
     return points
 
 
 def generate_rectangle_coordinates_lonlat(lon, lat, width_m, height_m, yaw=0, source_epsg=None, target_epsg=None):
     """Generate a rectangle with center at lon/lat with given dimensions."""
-    x, y = lonlat_to_utm(lon, lat, source_epsg, target_epsg)
-
-    agent_utm_coords = generate_rectangle_coordinates_utm(
-        center_x=x,
-        center_y=y,
-        width_m=width_m,
-        height_m=height_m,
-        yaw=yaw
-    )
+    to_target, _ = _get_transformers(source_epsg, target_epsg)
+    x, y = to_target.transform(lon, lat)
+
+    agent_utm_coords = generate_rectangle_coordinates_utm(x, y, width_m, height_m, yaw)
 
     return utm_rectangle_to_lonlat(agent_utm_coords, source_epsg, target_epsg)
 
 
 def utm_rectangle_to_lonlat(utm_points, source_epsg=None, target_epsg=None):
     """Convert rectangle points from UTM to longitude/latitude and close the polygon."""
-    source_points = [utm_to_lonlat(p[0], p[1], source_epsg, target_epsg) for p in utm_points]
+    _, to_source = _get_transformers(source_epsg, target_epsg)
 
-    # Close the polygon by repeating the first point
-    source_points.append(source_points[0])
+    # Transform all corners in a single batched call
+    xs, ys = to_source.transform([p[0] for p in utm_points], [p[1] for p in utm_points])
+    source_points = [[x, y] for x, y in zip(xs, ys)]
+
+    # Close the polygon with a copy of the first point, not the same list
+    source_points.append(list(source_points[0]))
 
     return source_points
 
@@ -348,7 +353,7 @@ def utm_rectangle_to_lonlat(utm_points, source_epsg=None, target_epsg=None):
 def generate_random_point_utm(center_x, center_y, radius_m=300):
     """Generate a random point near a center in UTM coordinates (meters)."""
     angle = random.uniform(0, 2 * math.pi)
-    distance = random.uniform(0, radius_m)
+    distance = radius_m * math.sqrt(random.random())
 
     x = center_x + distance * math.cos(angle)
     y = center_y + distance * math.sin(angle)
@@ -356,9 +361,38 @@ def generate_random_point_utm(center_x, center_y, radius_m=300):
     return [x, y]
 
 
+def generate_random_points_utm(center_x, center_y, radius_m=300, n=1):
+    """
+    Generate n random points uniformly distributed in a disk in UTM coordinates (meters).
+
+    Args:
+        center_x (float): Center x coordinate
+        center_y (float): Center y coordinate
+        radius_m (float, optional): Disk radius in meters
+        n (int, optional): Number of points to generate
+
+    Returns:
+        tuple: Arrays of x and y coordinates
+    """
+    angles = _rng.random(n) * (2 * math.pi)
+    distances = radius_m * np.sqrt(_rng.random(n))
+
+    xs = center_x + distances * np.cos(angles)
+    ys = center_y + distances * np.sin(angles)
+
+    return xs, ys
+
+
+def generate_random_points(center_x=300, center_y=300, radius=30, n=1):
+    """Generate n random points near a center as a GeoJSON coordinates array."""
+    xs, ys = generate_random_points_utm(center_x, center_y, radius, n)
+    return np.column_stack((xs, ys)).tolist()
+
+
 def utm_point_to_lonlat(utm_point, source_epsg=None, target_epsg=None):
     """Convert a single point from UTM to longitude/latitude."""
-    return utm_to_lonlat(utm_point[0], utm_point[1], source_epsg, target_epsg)
+    _, to_source = _get_transformers(source_epsg, target_epsg)
+    return to_source.transform(utm_point[0], utm_point[1])
 
 
 def points_feature_collection(x_list, y_list, point_properties=None):
@@ -1,19 +1,32 @@
 # enhanced_playback.py (updated with repeat option)
 import os
 import argparse
+import array
+import io
 import asyncio
-import json
 import logging
+import mmap
 import time
-import threading
 import sys
 from datetime import datetime
 from pathlib import Path
 import signal
+import termios
+import tty
 
 sys.path.append(str(Path(__file__).resolve().parent.parent))
+import ijson
+import orjson
+import numpy as np
 import zmq
 from libs.publisher import Publisher
+from libs.runtime import run_main
+
+try:
+    # Optional: reading recordings compressed by the recorder's --compress zstd
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # Configure logging
 logging.basicConfig(
@@ -23,6 +36,40 @@ logging.basicConfig(
 
 DEFAULT_ZMQ_ENDPOINT = os.environ.get("CVIZ_ZMQ_ENDPOINT", "tcp://127.0.0.1:5555")
 
+# Recordings streamed line by line by the recorder
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl')
+
+# Errors raised while decompressing a damaged .zst recording
+ZSTD_ERRORS = (zstandard.ZstdError,) if zstandard else ()
+
+# Keys that act immediately when stdin is a terminal
+SINGLE_KEY_COMMANDS = frozenset(' 0123456789+-[]<>rlnshq')
+
+# Messages sent back to back before yielding to the event loop when behind schedule
+CATCH_UP_BATCH = 64
+
+# Signals that stop playback cleanly (restoring the terminal) instead of killing it
+STOP_SIGNALS = (signal.SIGINT, signal.SIGTERM, signal.SIGHUP)
+
+
+class MappedPayloads:
+    """Payloads of a binary recording, sliced out of the mapping only when sent."""
+
+    __slots__ = ('_view', '_bounds')
+
+    def __init__(self, view, bounds):
+        self._view = view
+        self._bounds = bounds
+
+    def __len__(self):
+        return len(self._bounds) - 1
+
+    def __getitem__(self, index):
+        start, end = self._bounds[index], self._bounds[index + 1]
+        # Empty slices mark unpublishable messages
+        return self._view[start:end] if end > start else None
+
+
 class InteractivePlayback:
     """Interactive playback tool with speed control, repeat, and pause/resume functionality."""
 
@@ -30,7 +77,7 @@ class InteractivePlayback:
         """Initialize the interactive playback system.
 
         Args:
-            recording_file (str): Path to the recording JSON file.
+            recording_file (str): Path to the recording file (.json, .ndjson, .ndjson.zst) or binary directory.
             zmq_endpoint (str): ZMQ endpoint for publishers.
             initial_speed (float): Initial playback speed multiplier.
             repeat (bool): Whether to repeat the playback continuously.
@@ -41,9 +88,21 @@ class InteractivePlayback:
         self.repeat = repeat
 
         # Playback state
-        self.recorded_data = None
         self.metadata = None
-        self.messages = None
+        self.total_duration = 0.0
+        self.n_messages = 0
+
+        # Messages are stored column-wise: timestamps, topic indices and payloads
+        self._ts = None
+        self._topics = None
+        self._topic_idx = None
+        self._payloads = None
+        self._offsets = None
+        self._topic_types = None
+        self._payload_map = None
+        self._frames = None
+        self._pub_list = None
+        self._msg_pub_idx = None
         self.publishers = {}
 
         # Control state
@@ -53,70 +112,254 @@ class InteractivePlayback:
         self.current_message_index = 0
         self.loop_count = 0
 
-        # Timing
+        # Timing (integer nanoseconds on the monotonic clock)
         self.playback_start_time = None
         self.loop_start_time = None
         self.pause_time = None
         self.total_pause_duration = 0
 
-        # Threading for user input
-        self.input_thread = None
+        # Precomputed schedule: deadline = base + offset * inv_speed
+        self._deadline_base = None
+        self._inv_speed = None
+        self._deadlines = None
+
+        # Set by control input to wake the playback loop early
+        self._control_event = None
+
+        # Event-loop driven user input; the fd is resolved in play(), since stdin
+        # may be closed or replaced (e.g. under a supervisor)
+        self._stdin_fd = None
+        self._input_buffer = b''
+        self._key_buffer = ''
+        self._saved_term = None
 
         logging.info(f"Interactive playback initialized with file: {self.recording_file}")
         logging.info(f"Initial speed: {self.speed_factor}x")
         logging.info(f"Repeat mode: {'ON' if self.repeat else 'OFF'}")
 
-        # Setup signal handlers
-        signal.signal(signal.SIGINT, self.handle_interrupt)
-
-    def handle_interrupt(self, signum, frame):
+    def handle_interrupt(self):
         """Handle keyboard interrupt gracefully."""
         logging.info("Received interrupt signal, stopping playback...")
         self.stop_playback = True
-        if self.input_thread and self.input_thread.is_alive():
-            # Send a newline to help exit the input thread
-            print()
+        self._control_event.set()
 
     def load_recording(self):
-        """Load recording data from the JSON file."""
-        try:
-            with open(self.recording_file, 'r') as f:
-                self.recorded_data = json.load(f)
+        """Load recording data from a JSON or NDJSON file, or a binary recording directory."""
+        if self.recording_file.is_dir():
+            return self.load_binary_recording()
 
-            self.metadata = self.recorded_data.get("metadata", {})
-            self.messages = self.recorded_data.get("messages", [])
+        try:
+            with open(self.recording_file, 'rb') as f:
+                if self.recording_file.suffix == '.zst':
+                    if zstandard is None:
+                        raise ValueError("Reading .zst recordings requires the zstandard package")
+                    if Path(self.recording_file.stem).suffix not in NDJSON_SUFFIXES:
+                        raise ValueError("Only NDJSON recordings can be read compressed")
+                    self.metadata = {}
+                    reader = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f))
+                    self.collect_messages(self.iter_ndjson(reader))
+                elif self.recording_file.suffix in NDJSON_SUFFIXES:
+                    # Metadata lines are merged as they are read, the trailer last
+                    self.metadata = {}
+                    self.collect_messages(self.iter_ndjson(f))
+                else:
+                    self.metadata = dict(ijson.kvitems(f, 'metadata', use_float=True))
+                    f.seek(0)
+                    self.collect_messages(ijson.items(f, 'messages.item', use_float=True))
 
             logging.info(f"Loaded recording from {self.recording_file}")
-            logging.info(f"Total messages: {len(self.messages)}")
+            logging.info(f"Total messages: {self.n_messages}")
             logging.info(f"Recording duration: {self.metadata.get('duration_seconds', 'unknown')}s")
 
-            if not self.messages:
+            return True
+
+        except (ijson.JSONError, FileNotFoundError, ValueError, *ZSTD_ERRORS) as e:
+            logging.error(f"Error loading recording: {e}")
+            return False
+
+    def iter_ndjson(self, f):
+        """Yield the messages of an NDJSON recording, collecting metadata lines on the way."""
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                # A recorder that was killed can leave a partial last line
+                logging.warning(f"Skipping malformed line {line_number} in {self.recording_file}")
+                continue
+
+            if "metadata" in record:
+                self.metadata.update(record["metadata"])
+            else:
+                yield record
+
+    def collect_messages(self, messages):
+        """Store parsed messages as columns, keeping only the fields needed for playback."""
+        timestamps = array.array('d')
+        topic_idx = array.array('i')
+        payloads = []
+        topic_to_idx = {}
+        in_order = True
+        last_timestamp = float('-inf')
+        for message in messages:
+            timestamp = message.get("timestamp", 0)
+            topic = message.get("topic")
+            if timestamp < last_timestamp:
+                in_order = False
+            last_timestamp = timestamp
+
+            if topic not in topic_to_idx:
+                topic_to_idx[topic] = len(topic_to_idx)
+
+            timestamps.append(timestamp)
+            topic_idx.append(topic_to_idx[topic])
+            payloads.append(message.get("data", {}))
+
+        if not timestamps:
+            raise ValueError("No messages found in the recording")
+
+        # The recorder writes messages in arrival order, so only sort if needed
+        if not in_order:
+            order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+            timestamps = array.array('d', [timestamps[i] for i in order])
+            topic_idx = array.array('i', [topic_idx[i] for i in order])
+            payloads = [payloads[i] for i in order]
+
+        # Contiguous float64 timestamps for vectorized seek and status math
+        self.index_timestamps(np.frombuffer(timestamps, dtype=np.float64))
+        self._topics = list(topic_to_idx)
+        self._topic_idx = topic_idx
+        self._payloads = payloads
+        self._frames = None
+
+        # The first data_type seen on a topic determines its publisher
+        self._topic_types = {}
+        for idx, data in zip(topic_idx, payloads):
+            topic = self._topics[idx]
+            if topic and topic not in self._topic_types and isinstance(data, dict) and data.get("data_type"):
+                self._topic_types[topic] = data["data_type"]
+
+    def load_binary_recording(self):
+        """Memory-map a binary recording directory written by save_binary_recording."""
+        try:
+            with open(self.recording_file / "header.json", 'rb') as f:
+                header = orjson.loads(f.read())
+
+            self.metadata = header["metadata"]
+            self._topics = header["topics"]
+            self._topic_types = header["topic_types"]
+
+            timestamps = np.memmap(self.recording_file / "timestamps.f64", dtype=np.float64, mode='r')
+            self._topic_idx = np.memmap(self.recording_file / "topic_ids.i32", dtype=np.int32, mode='r')
+            # The offset index is small and read on every send, so it is loaded into memory
+            bounds = array.array('q')
+            with open(self.recording_file / "offsets.i64", 'rb') as f:
+                bounds.frombytes(f.read())
+
+            if not len(timestamps):
                 raise ValueError("No messages found in the recording")
 
-            # Sort messages by timestamp
-            self.messages.sort(key=lambda x: x.get("timestamp", 0))
+            # Payloads stay in the mapping and are sliced when published, so
+            # loading does not touch (or copy) the payload bytes at all
+            view = memoryview(b'')
+            if bounds[-1] > 0:
+                with open(self.recording_file / "payloads.bin", 'rb') as f:
+                    self._payload_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                view = memoryview(self._payload_map)
+            self._frames = MappedPayloads(view, bounds)
+
+            self.index_timestamps(timestamps)
+            self._payloads = None
+
+            logging.info(f"Loaded binary recording from {self.recording_file}")
+            logging.info(f"Total messages: {self.n_messages}")
+            logging.info(f"Recording duration: {self.metadata.get('duration_seconds', 'unknown')}s")
 
             return True
 
-        except (json.JSONDecodeError, FileNotFoundError) as e:
+        except (KeyError, OSError, ValueError, orjson.JSONDecodeError) as e:
             logging.error(f"Error loading recording: {e}")
             return False
 
+    def save_binary_recording(self, output_dir):
+        """Write the loaded, encoded recording as a directory of flat arrays for mmap loading.
+
+        Args:
+            output_dir (str): Directory to create, e.g. ``recording.cviz``.
+        """
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        header = {
+            "version": 1,
+            "metadata": self.metadata,
+            "topics": self._topics,
+            "topic_types": self._topic_types
+        }
+        with open(output_dir / "header.json", 'wb') as f:
+            f.write(orjson.dumps(header, option=orjson.OPT_INDENT_2))
+
+        np.ascontiguousarray(self._ts, dtype=np.float64).tofile(output_dir / "timestamps.f64")
+        np.asarray(self._topic_idx, dtype=np.int32).tofile(output_dir / "topic_ids.i32")
+
+        offsets = array.array('q', [0])
+        with open(output_dir / "payloads.bin", 'wb') as f:
+            for frame in self._frames:
+                if frame is not None:
+                    f.write(frame)
+                offsets.append(offsets[-1] + (len(frame) if frame is not None else 0))
+        with open(output_dir / "offsets.i64", 'wb') as f:
+            offsets.tofile(f)
+
+        logging.info(f"Binary recording saved to {output_dir}")
+
+    def index_timestamps(self, timestamps):
+        """Set up the timestamp-derived columns shared by all recording formats."""
+        self._ts = timestamps
+        self.n_messages = len(timestamps)
+        # Recordings cut short have no trailer, so fall back to the message span
+        self.total_duration = float(self.metadata.get('duration_seconds', timestamps[-1] - timestamps[0]))
+        # Integer nanosecond offsets from the first message, computed in one vectorized pass
+        self._offsets = array.array('q')
+        self._offsets.frombytes(np.rint((timestamps - timestamps[0]) * 1e9).astype(np.int64).tobytes())
+
     def create_publishers(self):
         """Create ZMQ publishers for each unique topic."""
-        topic_types = {}
+        for topic, data_type in self._topic_types.items():
+            self.publishers[topic] = Publisher(topic_name=topic, data_type=data_type, zmq_endpoint=self.zmq_endpoint)
+            logging.info(f"Created publisher for topic: {topic} (data_type: {data_type})")
 
-        for message in self.messages:
-            topic = message.get("topic")
-            data = message.get("data", {})
-            data_type = data.get("data_type")
+        # Map each message to a publisher by list index so the hot loop avoids hashing topics
+        self._pub_list = list(self.publishers.values())
+        pub_to_idx = {topic: i for i, topic in enumerate(self.publishers)}
+        topic_pub_idx = [pub_to_idx.get(topic, -1) for topic in self._topics]
+        self._msg_pub_idx = array.array('i', [topic_pub_idx[idx] for idx in self._topic_idx])
 
-            if topic and data_type and topic not in topic_types:
-                topic_types[topic] = data_type
+    def encode_frames(self):
+        """Serialize every publishable message once so playback only sends bytes."""
+        if self._payloads is None:
+            # Binary recordings are loaded pre-encoded
+            return
 
-        for topic, data_type in topic_types.items():
-            self.publishers[topic] = Publisher(topic_name=topic, data_type=data_type)
-            logging.info(f"Created publisher for topic: {topic} (data_type: {data_type})")
+        self._frames = []
+
+        for idx, data in zip(self._topic_idx, self._payloads):
+            topic = self._topics[idx]
+            data_type = self._topic_types.get(topic)
+
+            if data_type is None or not isinstance(data, dict):
+                self._frames.append(None)
+                continue
+
+            # The payload dicts are owned by the playback, so the envelope
+            # fields can be written in place rather than into a copy
+            data['data_type'] = data_type
+            data['topic'] = topic
+            self._frames.append(zmq.Frame(orjson.dumps(data)))
+
+        # Playback only sends the immutable frames from here on
+        self._payloads = None
 
     def print_controls(self):
         """Print the control instructions."""
@@ -131,6 +374,7 @@ class InteractivePlayback:
         print("r            - Reset to beginning")
         print("l            - Toggle repeat mode")
         print("n            - Skip to next loop (if in repeat mode)")
+        print("%<pct> Enter - Seek to percentage (e.g., %50)")
         print("s            - Show current status")
         print("q            - Quit playback")
         print("h            - Show this help")
@@ -143,20 +387,15 @@ class InteractivePlayback:
 
     def show_status(self):
         """Show current playback status."""
-        if not self.messages:
+        if self._ts is None:
             return
 
-        current_msg = self.messages[self.current_message_index] if self.current_message_index < len(
-            self.messages) else None
-        total_duration = self.metadata.get('duration_seconds', 0)
+        total_duration = self.total_duration
 
-        if current_msg and self.playback_start_time:
-            first_timestamp = self.messages[0].get("timestamp", 0)
-            current_timestamp = current_msg.get("timestamp", 0)
-            elapsed_recording_time = current_timestamp - first_timestamp
+        if self.current_message_index < self.n_messages and self.playback_start_time:
+            elapsed_recording_time = float(self._ts[self.current_message_index] - self._ts[0])
 
             # Calculate total elapsed time including loops
-            current_loop_time = time.time() - (self.loop_start_time or self.playback_start_time)
             total_elapsed_time = (self.loop_count * total_duration) + elapsed_recording_time
 
             print(f"\n--- PLAYBACK STATUS ---")
@@ -165,7 +404,7 @@ class InteractivePlayback:
             print(f"Repeat: {'ON' if self.repeat else 'OFF'}")
             if self.repeat:
                 print(f"Loop: {self.loop_count + 1}")
-            print(f"Progress: {self.current_message_index + 1}/{len(self.messages)} messages")
+            print(f"Progress: {self.current_message_index + 1}/{self.n_messages} messages")
             print(f"Current loop time: {elapsed_recording_time:.1f}s / {total_duration:.1f}s")
             print(f"Current loop progress: {(elapsed_recording_time / max(total_duration, 1)) * 100:.1f}%")
             if self.repeat and self.loop_count > 0:
@@ -174,56 +413,44 @@ class InteractivePlayback:
 
     def seek_to_percentage(self, percentage):
         """Seek to a specific percentage of the current loop."""
-        if not self.messages:
+        if self._ts is None:
             return
 
-        target_index = int((percentage / 100.0) * len(self.messages))
-        target_index = max(0, min(target_index, len(self.messages) - 1))
-
         # Find the closest message by timestamp
-        first_timestamp = self.messages[0].get("timestamp", 0)
-        total_duration = self.metadata.get('duration_seconds', 0)
-        target_time = first_timestamp + (percentage / 100.0) * total_duration
+        first_timestamp = self._ts[0]
+        target_time = first_timestamp + (percentage / 100.0) * self.total_duration
 
         # Binary search for closest timestamp
-        left, right = 0, len(self.messages) - 1
-        while left < right:
-            mid = (left + right) // 2
-            if self.messages[mid].get("timestamp", 0) < target_time:
-                left = mid + 1
-            else:
-                right = mid
-
-        self.current_message_index = left
-        self.seek_to_time = time.time()
+        self.current_message_index = min(int(np.searchsorted(self._ts, target_time)), self.n_messages - 1)
+        self.seek_to_time = time.monotonic_ns()
         logging.info(f"Seeked to {percentage:.1f}% (message {self.current_message_index + 1})")
 
     def seek_by_seconds(self, seconds):
         """Seek forward or backward by a number of seconds."""
-        if not self.messages or self.current_message_index >= len(self.messages):
+        if self._ts is None or self.current_message_index >= self.n_messages:
             return
 
-        current_timestamp = self.messages[self.current_message_index].get("timestamp", 0)
-        target_timestamp = current_timestamp + seconds
+        target_timestamp = self._ts[self.current_message_index] + seconds
 
         # Find the message closest to the target timestamp
-        best_index = self.current_message_index
-        best_diff = abs(self.messages[best_index].get("timestamp", 0) - target_timestamp)
-
-        for i, msg in enumerate(self.messages):
-            diff = abs(msg.get("timestamp", 0) - target_timestamp)
-            if diff < best_diff:
-                best_diff = diff
-                best_index = i
-
-        self.current_message_index = max(0, min(best_index, len(self.messages) - 1))
-        self.seek_to_time = time.time()
+        best_index = int(np.searchsorted(self._ts, target_timestamp))
+        if best_index == self.n_messages:
+            best_index -= 1
+        elif best_index > 0:
+            # Pick the nearer of the two neighbours around the insertion point
+            before = target_timestamp - self._ts[best_index - 1]
+            after = self._ts[best_index] - target_timestamp
+            if before <= after:
+                best_index -= 1
+
+        self.current_message_index = max(0, min(best_index, self.n_messages - 1))
+        self.seek_to_time = time.monotonic_ns()
         logging.info(f"Seeked by {seconds}s to message {self.current_message_index + 1}")
 
     def reset_to_beginning(self):
         """Reset playback to the beginning of the current loop."""
         self.current_message_index = 0
-        self.loop_start_time = time.time()
+        self.loop_start_time = time.monotonic_ns()
         self.seek_to_time = self.loop_start_time
         self.total_pause_duration = 0
         print("Reset to beginning of current loop")
@@ -234,91 +461,219 @@ class InteractivePlayback:
             print("Repeat mode is OFF, cannot skip to next loop")
             return
 
-        self.current_message_index = len(self.messages)  # This will trigger loop restart
+        self.current_message_index = self.n_messages  # This will trigger loop restart
         print("Skipping to next loop...")
 
+    def handle_command(self, user_input):
+        """Apply a single line of user input to the playback state."""
+        if user_input == ' ' or user_input == '':
+            # Toggle pause
+            self.is_paused = not self.is_paused
+            if self.is_paused:
+                self.pause_time = time.monotonic_ns()
+                print("Playback PAUSED")
+            else:
+                if self.pause_time:
+                    self.total_pause_duration += time.monotonic_ns() - self.pause_time
+                print("Playback RESUMED")
+
+        elif user_input in '0123456789':
+            # Set speed based on number
+            speed_map = {'0': 0.1, '1': 1.0, '2': 2.0, '3': 3.0, '4': 4.0,
+                         '5': 5.0, '6': 6.0, '7': 7.0, '8': 8.0, '9': 9.0}
+            self.speed_factor = speed_map[user_input]
+            print(f"Speed set to {self.speed_factor}x")
+
+        elif user_input == '+':
+            self.speed_factor = min(10.0, self.speed_factor + 0.1)
+            print(f"Speed increased to {self.speed_factor:.1f}x")
+
+        elif user_input == '-':
+            self.speed_factor = max(0.1, self.speed_factor - 0.1)
+            print(f"Speed decreased to {self.speed_factor:.1f}x")
+
+        elif user_input == '[':
+            self.seek_by_seconds(-5)
+
+        elif user_input == ']':
+            self.seek_by_seconds(5)
+
+        elif user_input == '<':
+            self.seek_by_seconds(-30)
+
+        elif user_input == '>':
+            self.seek_by_seconds(30)
+
+        elif user_input == 'r':
+            self.reset_to_beginning()
+
+        elif user_input == 'l':
+            self.repeat = not self.repeat
+            print(f"Repeat mode {'ON' if self.repeat else 'OFF'}")
+
+        elif user_input == 'n':
+            self.skip_to_next_loop()
+
+        elif user_input == 's':
+            self.show_status()
+
+        elif user_input == 'h':
+            self.print_controls()
+
+        elif user_input == 'q':
+            print("Quitting playback...")
+            self.stop_playback = True
+
+        elif user_input.startswith('seek ') or user_input.startswith('%'):
+            # Allow seeking to percentage, e.g., "seek 50" or "%50"
+            try:
+                percentage = float(user_input.lstrip('%').split()[-1])
+                self.seek_to_percentage(percentage)
+            except (IndexError, ValueError):
+                print("Usage: seek <percentage> (e.g., seek 50 or %50)")
+
     def handle_user_input(self):
-        """Handle user input in a separate thread."""
+        """Handle stdin readiness from the event loop without blocking."""
         try:
-            while not self.stop_playback:
+            chunk = os.read(self._stdin_fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            logging.error(f"Error in input handler: {e}")
+            chunk = b''
+
+        if not chunk:
+            # Handle Ctrl+D / closed stdin
+            asyncio.get_running_loop().remove_reader(self._stdin_fd)
+            return
+
+        if self._saved_term is not None:
+            self.handle_keys(chunk.decode('utf-8', errors='replace'))
+        else:
+            self._input_buffer += chunk
+            *lines, self._input_buffer = self._input_buffer.split(b'\n')
+            for line in lines:
                 try:
-                    user_input = input().strip().lower()
-
-                    if user_input == ' ' or user_input == '':
-                        # Toggle pause
-                        self.is_paused = not self.is_paused
-                        if self.is_paused:
-                            self.pause_time = time.time()
-                            print("Playback PAUSED")
-                        else:
-                            if self.pause_time:
-                                self.total_pause_duration += time.time() - self.pause_time
-                            print("Playback RESUMED")
-
-                    elif user_input in '0123456789':
-                        # Set speed based on number
-                        speed_map = {'0': 0.1, '1': 1.0, '2': 2.0, '3': 3.0, '4': 4.0,
-                                     '5': 5.0, '6': 6.0, '7': 7.0, '8': 8.0, '9': 9.0}
-                        self.speed_factor = speed_map[user_input]
-                        print(f"Speed set to {self.speed_factor}x")
-
-                    elif user_input == '+':
-                        self.speed_factor = min(10.0, self.speed_factor + 0.1)
-                        print(f"Speed increased to {self.speed_factor:.1f}x")
-
-                    elif user_input == '-':
-                        self.speed_factor = max(0.1, self.speed_factor - 0.1)
-                        print(f"Speed decreased to {self.speed_factor:.1f}x")
-
-                    elif user_input == '[':
-                        self.seek_by_seconds(-5)
-
-                    elif user_input == ']':
-                        self.seek_by_seconds(5)
-
-                    elif user_input == '<':
-                        self.seek_by_seconds(-30)
-
-                    elif user_input == '>':
-                        self.seek_by_seconds(30)
-
-                    elif user_input == 'r':
-                        self.reset_to_beginning()
-
-                    elif user_input == 'l':
-                        self.repeat = not self.repeat
-                        print(f"Repeat mode {'ON' if self.repeat else 'OFF'}")
-
-                    elif user_input == 'n':
-                        self.skip_to_next_loop()
-
-                    elif user_input == 's':
-                        self.show_status()
-
-                    elif user_input == 'h':
-                        self.print_controls()
-
-                    elif user_input == 'q':
-                        print("Quitting playback...")
-                        self.stop_playback = True
-                        break
-
-                    elif user_input.startswith('seek '):
-                        # Allow seeking to percentage, e.g., "seek 50"
-                        try:
-                            percentage = float(user_input.split()[1])
-                            self.seek_to_percentage(percentage)
-                        except (IndexError, ValueError):
-                            print("Usage: seek <percentage> (e.g., seek 50)")
-
-                except EOFError:
-                    # Handle Ctrl+D
-                    break
-                except KeyboardInterrupt:
+                    self.handle_command(line.decode('utf-8', errors='replace').strip().lower())
+                except Exception as e:
+                    logging.error(f"Error in input handler: {e}")
+
+        # Wake the playback loop so the new state takes effect immediately
+        self.update_schedule()
+        self._control_event.set()
+
+    def handle_keys(self, keys):
+        """Dispatch raw keystrokes, buffering only a "%<pct>" seek until Enter."""
+        for key in keys:
+            try:
+                if self._key_buffer:
+                    if key in '\r\n':
+                        line, self._key_buffer = self._key_buffer, ''
+                        print()
+                        self.handle_command(line)
+                    elif key in '\x7f\b':
+                        self._key_buffer = self._key_buffer[:-1]
+                        print('\b \b', end='', flush=True)
+                    else:
+                        self._key_buffer += key
+                        print(key, end='', flush=True)
+                elif key == '%':
+                    self._key_buffer = key
+                    print(key, end='', flush=True)
+                elif key in '\r\n':
+                    self.handle_command('')
+                elif key.lower() in SINGLE_KEY_COMMANDS:
+                    self.handle_command(key.lower())
+            except Exception as e:
+                logging.error(f"Error in input handler: {e}")
+
+    def enable_raw_input(self):
+        """Switch a terminal stdin to cbreak mode so keys register without Enter."""
+        if not os.isatty(self._stdin_fd):
+            return
+        self._saved_term = termios.tcgetattr(self._stdin_fd)
+        # cbreak keeps ISIG, so Ctrl+C still reaches the SIGINT handler
+        tty.setcbreak(self._stdin_fd)
+
+    def restore_terminal(self):
+        """Restore the terminal settings changed by enable_raw_input."""
+        if self._saved_term is None:
+            return
+        termios.tcsetattr(self._stdin_fd, termios.TCSADRAIN, self._saved_term)
+        self._saved_term = None
+
+    def update_schedule(self):
+        """Recompute the deadlines, which only change on speed, pause, seek or loop events."""
+        self._inv_speed = 1.0 / self.speed_factor
+        if self.loop_start_time is None:
+            return
+
+        self._deadline_base = self.loop_start_time + self.total_pause_duration
+
+        # Evaluate every absolute deadline in one vectorized pass so the
+        # steady-state loop only compares integers against the clock
+        offsets = np.frombuffer(self._offsets, dtype=np.int64)
+        deadlines = self._deadline_base + (offsets * self._inv_speed).astype(np.int64)
+        self._deadlines = array.array('q')
+        self._deadlines.frombytes(deadlines.tobytes())
+
+    async def wait_for_control(self, timeout=None):
+        """Sleep until the timeout elapses or a control input arrives."""
+        try:
+            await asyncio.wait_for(self._control_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._control_event.clear()
+
+    async def play_steady(self):
+        """Publish messages on schedule until the recording ends or a control event arrives."""
+        frames = self._frames
+        deadlines = self._deadlines
+        pub_list = self._pub_list
+        msg_pub_idx = self._msg_pub_idx
+        control_event = self._control_event
+        n = self.n_messages
+        index = self.current_message_index
+
+        while index < n:
+            # Wait until it's time to publish
+            wait_ns = deadlines[index] - time.monotonic_ns()
+            if wait_ns > 0:
+                # Sleep for the exact delay; control input wakes us early
+                self.current_message_index = index
+                try:
+                    await asyncio.wait_for(control_event.wait(), wait_ns / 1e9)
+                    return
+                except asyncio.TimeoutError:
+                    pass
+
+            # Publish every message that is already due as one batch, without
+            # re-entering the event loop between sends
+            now = time.monotonic_ns()
+            batch_end = min(index + CATCH_UP_BATCH, n)
+            while True:
+                payload = frames[index]
+                if payload is not None:
+                    pub_list[msg_pub_idx[index]].publish_raw(payload)
+
+                    # Log progress periodically
+                    if index % 100 == 0:
+                        progress = (index + 1) / n * 100
+                        loop_info = f" (Loop #{self.loop_count + 1})" if self.repeat and self.loop_count > 0 else ""
+                        print(f"Progress: {progress:.1f}% (Speed: {self.speed_factor}x){loop_info}")
+
+                index += 1
+                if index >= batch_end or deadlines[index] > now:
                     break
 
-        except Exception as e:
-            logging.error(f"Error in input handler: {e}")
+            if index == batch_end and index < n:
+                # Still catching up: yield once per batch so control input is not starved
+                self.current_message_index = index
+                await asyncio.sleep(0)
+                if control_event.is_set():
+                    return
+
+        self.current_message_index = index
 
     async def play(self):
         """Play back the recorded data with interactive controls and repeat option."""
@@ -326,94 +681,91 @@ class InteractivePlayback:
             return
 
         self.create_publishers()
+        self.encode_frames()
 
-        if not self.messages:
+        if self._ts is None:
             logging.warning("No messages to play back")
             return
 
-        # Start input handling thread
-        self.input_thread = threading.Thread(target=self.handle_user_input, daemon=True)
-        self.input_thread.start()
+        # Handle stdin and stop signals on the event loop
+        self._control_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        try:
+            self._stdin_fd = sys.stdin.fileno()
+            loop.add_reader(self._stdin_fd, self.handle_user_input)
+            self.enable_raw_input()
+        except (AttributeError, ValueError, OSError, NotImplementedError) as e:
+            # stdin is missing, closed, a regular file, or the loop cannot watch it
+            logging.warning(f"Interactive controls unavailable: {e}")
+            self._stdin_fd = None
+        # SIGTERM/SIGHUP stop the same way as Ctrl+C so the terminal mode is restored
+        for signum in STOP_SIGNALS:
+            loop.add_signal_handler(signum, self.handle_interrupt)
 
         # Print initial instructions
         self.print_controls()
 
         # Initialize timing
-        first_timestamp = self.messages[0].get("timestamp", 0)
-        self.playback_start_time = time.time()
+        self.playback_start_time = time.monotonic_ns()
         self.loop_start_time = self.playback_start_time
+        self.update_schedule()
 
         logging.info(f"Starting interactive playback...")
         if self.repeat:
             logging.info("Repeat mode is ON - playback will loop continuously")
 
-        # Main playback loop
+        # Main playback loop: handles repeat, pause and seek, then hands the
+        # steady state to play_steady until the next control event
         while not self.stop_playback:
             # Reset to beginning if we've reached the end and repeat is enabled
-            if self.current_message_index >= len(self.messages):
+            if self.current_message_index >= self.n_messages:
                 if self.repeat:
                     self.loop_count += 1
                     self.current_message_index = 0
-                    self.loop_start_time = time.time()
+                    self.loop_start_time = time.monotonic_ns()
                     self.total_pause_duration = 0
+                    self.update_schedule()
                     logging.info(f"Starting loop #{self.loop_count + 1}")
                 else:
                     break
 
             # Handle pause
             if self.is_paused:
-                await asyncio.sleep(0.1)
+                await self.wait_for_control()
                 continue
 
-            message = self.messages[self.current_message_index]
-            message_time = message.get("timestamp", 0)
-            topic = message.get("topic")
-            data = message.get("data", {})
-
-            # Calculate timing
             if self.seek_to_time is not None:
                 # We just seeked, reset timing
-                self.loop_start_time = self.seek_to_time - (message_time - first_timestamp) / self.speed_factor
+                offset = self._offsets[self.current_message_index]
+                self.loop_start_time = self.seek_to_time - int(offset / self.speed_factor)
                 self.total_pause_duration = 0
                 self.seek_to_time = None
+                self.update_schedule()
 
-            # Calculate when this message should be played
-            time_in_recording = message_time - first_timestamp
-            target_playback_time = self.loop_start_time + time_in_recording / self.speed_factor + self.total_pause_duration
-
-            # Wait until it's time to publish
-            current_time = time.time()
-            wait_time = target_playback_time - current_time
-
-            if wait_time > 0:
-                await asyncio.sleep(min(wait_time, 0.1))  # Cap wait time to allow responsive controls
-                continue
-
-            # Publish the message
-            if topic in self.publishers:
-                message_data = data.copy() if isinstance(data, dict) else data
-                self.publishers[topic].publish(message_data)
-
-                # Log progress periodically
-                if self.current_message_index % 100 == 0:
-                    progress = (self.current_message_index + 1) / len(self.messages) * 100
-                    loop_info = f" (Loop #{self.loop_count + 1})" if self.repeat and self.loop_count > 0 else ""
-                    print(f"Progress: {progress:.1f}% (Speed: {self.speed_factor}x){loop_info}")
-
-            self.current_message_index += 1
+            # No await since the checks above, so no control input can be lost here
+            self._control_event.clear()
+            await self.play_steady()
 
-        # Wait for input thread to finish
+        # Stop listening for input
         self.stop_playback = True
-        if self.input_thread.is_alive():
-            self.input_thread.join(timeout=1.0)
+        if self._stdin_fd is not None:
+            loop.remove_reader(self._stdin_fd)
+        for signum in STOP_SIGNALS:
+            loop.remove_signal_handler(signum)
+        self.restore_terminal()
 
-        total_duration = time.time() - self.playback_start_time - self.total_pause_duration
+        total_duration = (time.monotonic_ns() - self.playback_start_time - self.total_pause_duration) / 1e9
         total_loops = self.loop_count + (1 if self.current_message_index > 0 else 0)
         logging.info(f"Playback completed: {total_loops} loops in {total_duration:.2f} seconds")
 
     def cleanup(self):
         """Clean up resources."""
         logging.info("Cleaning up...")
+        self.restore_terminal()
+        for publisher in self.publishers.values():
+            publisher.close()
+        self.publishers.clear()
+        self._pub_list = None
 
 
 async def main():
@@ -424,6 +776,8 @@ async def main():
     parser.add_argument('--endpoint', type=str, default=DEFAULT_ZMQ_ENDPOINT, help='ZMQ endpoint')
     parser.add_argument('--repeat', '-r', action='store_true', help='Repeat playback continuously')
     parser.add_argument('--loops', type=int, help='Number of loops to play (requires --repeat)')
+    parser.add_argument('--export-binary', type=str, metavar='DIR',
+                        help='Convert the recording to the memory-mapped binary format and exit')
 
     args = parser.parse_args()
 
@@ -438,6 +792,14 @@ async def main():
         repeat=args.repeat
     )
 
+    if args.export_binary:
+        # Offline conversion: frames are encoded without binding any publisher
+        if not playback.load_recording():
+            return
+        playback.encode_frames()
+        playback.save_binary_recording(args.export_binary)
+        return
+
     # If loops is specified, we'll need to modify the logic slightly
     if args.loops:
         # Override the repeat logic to stop after N loops
@@ -457,11 +819,8 @@ async def main():
 
 
 if __name__ == "__main__":
-    # Handle the fact that input() doesn't work well with asyncio
-    import sys
-
     try:
-        asyncio.run(main())
+        run_main(main())
     except KeyboardInterrupt:
         print("\nPlayback interrupted by user")
     except Exception as e:
@@ -1,78 +1,127 @@
 import os
-import json
 import time
+import atexit
 import threading
 
+import orjson
 import zmq
 
 DEFAULT_ZMQ_ENDPOINT = os.environ.get("CVIZ_ZMQ_ENDPOINT", "tcp://127.0.0.1:5555")
 
-# PUB sockets keyed by endpoint so we only bind once per process.
-_endpoint_contexts = {}
-_endpoint_sockets = {}
-_endpoint_ref_counts = {}
+# PUB sockets keyed by endpoint so we only bind once per process. All sockets
+# share the process-wide context, which lives until exit.
+_ctx = zmq.Context.instance()
+_sockets = {}  # endpoint -> [socket, refcount]
 _endpoint_lock = threading.Lock()
 
+# How long queued messages may delay interpreter exit
+EXIT_LINGER_MS = 1000
+
 
 def _get_pub_socket(endpoint: str):
     """Return a PUB socket bound to the requested endpoint."""
     with _endpoint_lock:
-        if endpoint not in _endpoint_sockets:
-            context = zmq.Context()
-            socket = context.socket(zmq.PUB)
+        entry = _sockets.get(endpoint)
+        if entry is None:
+            socket = _ctx.socket(zmq.PUB)
+            # Absorb bursts (e.g. fast playback) before messages are dropped
+            socket.setsockopt(zmq.SNDHWM, 100000)
+            socket.setsockopt(zmq.SNDBUF, 1 << 20)
+            # Never let a stalled subscriber block shutdown indefinitely
+            socket.setsockopt(zmq.LINGER, EXIT_LINGER_MS)
             socket.bind(endpoint)
-            _endpoint_contexts[endpoint] = context
-            _endpoint_sockets[endpoint] = socket
-            _endpoint_ref_counts[endpoint] = 0
-        _endpoint_ref_counts[endpoint] += 1
-        return _endpoint_contexts[endpoint], _endpoint_sockets[endpoint]
+            entry = _sockets[endpoint] = [socket, 0]
+        entry[1] += 1
+        return entry[0]
 
 
 def _release_pub_socket(endpoint: str):
     """Release the PUB socket when no instances still reference it."""
     with _endpoint_lock:
-        if endpoint not in _endpoint_sockets:
+        entry = _sockets.get(endpoint)
+        if entry is None:
             return
 
-        _endpoint_ref_counts[endpoint] -= 1
+        entry[1] -= 1
+
+        if entry[1] <= 0:
+            del _sockets[endpoint]
+            entry[0].close(0)
 
-        if _endpoint_ref_counts[endpoint] <= 0:
-            socket = _endpoint_sockets.pop(endpoint)
-            context = _endpoint_contexts.pop(endpoint)
-            _endpoint_ref_counts.pop(endpoint)
-            try:
-                socket.close(0)
-            finally:
-                context.term()
+
+@atexit.register
+def _close_pub_sockets():
+    """Close sockets still open at exit; the shared context stays untouched."""
+    with _endpoint_lock:
+        for socket, _ in _sockets.values():
+            socket.close()
+        _sockets.clear()
 
 
 class Publisher:
     def __init__(self, topic_name: str, data_type: str, zmq_endpoint: str = None):
         """Initialise Publisher."""
         self.topic = topic_name
+        self._topic_bytes = topic_name.encode('utf-8')
+        # Built once and reused for every send; libzmq only refcounts it
+        self._topic_frame = zmq.Frame(self._topic_bytes)
         self.endpoint = zmq_endpoint or DEFAULT_ZMQ_ENDPOINT
 
         # TODO: Data type should be a class
         self.data_type = data_type
-        self._context, self._socket = _get_pub_socket(self.endpoint)
+        # Constant head of every payload, '{"data_type":...,"topic":...' without
+        # the closing brace; publish() appends the serialized message fields
+        self._envelope = orjson.dumps({'data_type': data_type, 'topic': topic_name})[:-1]
+        self._socket = _get_pub_socket(self.endpoint)
+
+    def close(self):
+        """Release this publisher's reference to the shared PUB socket."""
+        if self._socket is None:
+            return
+        self._socket = None
+        _release_pub_socket(self.endpoint)
 
-    # destructor
-    def __del__(self):
-        try:
-            _release_pub_socket(self.endpoint)
-        except Exception as e:
-            print(f"Error: {e}")
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def serialize(self, message: dict) -> bytes:
+        """Encode a message as this publisher's payload, with data_type and topic added.
+
+        Messages that never change can be serialized once and sent with publish_raw().
+        """
+        if 'data_type' in message or 'topic' in message:
+            # Let the publisher's values win without emitting duplicate keys,
+            # keeping the envelope fields first as in the fast path below
+            merged = {'data_type': self.data_type, 'topic': self.topic}
+            merged.update(message)
+            merged['data_type'] = self.data_type
+            merged['topic'] = self.topic
+            return orjson.dumps(merged, option=orjson.OPT_SERIALIZE_NUMPY)
+
+        # NumPy scalars/arrays (e.g. from simulation state) serialize natively
+        body = orjson.dumps(message, option=orjson.OPT_SERIALIZE_NUMPY)
+        return self._envelope + (b',' + body[1:] if len(body) > 2 else b'}')
 
     def publish(self, message: dict):
         """Publish a message to the ZMQ socket."""
         # TODO: message should be a class object. e.g. Polygon, Message
 
-        message['data_type'] = self.data_type
-        message['topic'] = self.topic
-        message = json.dumps(message)
+        # Payloads above pyzmq's copy threshold are handed over without a memcpy
+        self._send(self.serialize(message))
+
+    def publish_raw(self, payload):
+        """Publish an already-serialized payload (bytes or zmq.Frame) without copying it."""
+        self._send(payload)
 
-        self._socket.send_multipart([self.topic.encode('utf-8'),
-                                     message.encode('utf-8')])
+    def _send(self, payload):
+        """Send the topic frame and payload as one two-part message."""
+        # Two direct sends skip send_multipart's per-call list walk and type checks
+        socket = self._socket
+        socket.send(self._topic_frame, zmq.SNDMORE, copy=False)
+        socket.send(payload, copy=False)
 
 
 # test
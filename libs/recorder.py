@@ -1,17 +1,46 @@
 # recorder.py
 import argparse
-import json
 import logging
 import os
 import time
+import orjson
 import zmq
+import zmq.asyncio
 import asyncio
 import signal
 from datetime import datetime
 from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from libs.runtime import run_main
+
+try:
+    # Optional: on-the-fly compression of recordings
+    import zstandard as zstd
+except ImportError:
+    zstd = None
 
 DEFAULT_ZMQ_ENDPOINT = os.environ.get("CVIZ_ZMQ_ENDPOINT", "tcp://127.0.0.1:5555")
 
+# Receive queue sizes that absorb bursts without dropping messages
+DEFAULT_RCVHWM = 1_000_000
+DEFAULT_RCVBUF = 16 * 1024 * 1024
+
+# Encoded lines are grouped and written with one os.writev once either limit is hit.
+# The size limit stays below IOV_MAX (1024 on Linux).
+DEFAULT_MAX_BATCH_SIZE = 1000
+DEFAULT_MAX_BATCH_BYTES = 64 * 1024
+
+# Recordings are synced to disk in the background at this interval, bounding the data lost on a crash
+DEFAULT_SYNC_INTERVAL_MS = 200
+
+# fdatasync skips the metadata flush but is not available everywhere (e.g. macOS)
+_datasync = getattr(os, "fdatasync", os.fsync)
+
+# Upper bound on messages received per wakeup, so a flood cannot starve the event loop
+MAX_DRAIN = 1000
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -22,38 +51,59 @@ logging.basicConfig(
 class DataRecorder:
     """Records data from ZMQ publishers to a file."""
 
-    def __init__(self, topics=None, zmq_endpoint=DEFAULT_ZMQ_ENDPOINT, output_dir="recordings"):
+    def __init__(self, topics=None, zmq_endpoint=DEFAULT_ZMQ_ENDPOINT, output_dir="recordings",
+                 sync_interval_ms=DEFAULT_SYNC_INTERVAL_MS, compress="none",
+                 rcvhwm=DEFAULT_RCVHWM, rcvbuf=DEFAULT_RCVBUF):
         """Initialize the DataRecorder.
 
         Args:
             topics (list): List of topics to subscribe to. If None, subscribes to all topics.
             zmq_endpoint (str): ZMQ endpoint to connect to.
             output_dir (str): Directory to save recordings.
+            sync_interval_ms (int): Milliseconds between background data syncs. 0 syncs only at the end.
+            compress (str): "none" or "zstd" to compress the recording as it is written.
+            rcvhwm (int): Receive high-water mark in messages.
+            rcvbuf (int): Kernel receive buffer size in bytes.
         """
         self.topics = topics if topics else []
         self.zmq_endpoint = zmq_endpoint
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True, parents=True)
+        self.sync_interval_ms = sync_interval_ms
+        self._stopped = None
+        self.message_count = 0
+
+        if compress == "zstd" and zstd is None:
+            raise ImportError("zstd compression requires the zstandard package")
+        self.compress = compress
 
         # Initialize ZMQ context and socket
-        self.context = zmq.Context()
+        # Sockets come from the process-wide context, which must not be terminated here
+        self.context = zmq.asyncio.Context.instance()
         self.socket = self.context.socket(zmq.SUB)
+        self.socket.setsockopt(zmq.RCVHWM, rcvhwm)
+        self.socket.setsockopt(zmq.RCVBUF, rcvbuf)
         self.socket.connect(self.zmq_endpoint)
 
-        # Data storage for recording
-        self.recorded_data = {
-            "metadata": {
-                "start_time": datetime.now().isoformat(),
-                "topics": self.topics.copy() if self.topics else ["all"],
-                "zmq_endpoint": zmq_endpoint
-            },
-            "messages": []
+        # Recording metadata, written as the first and last line of the file
+        self.metadata = {
+            "start_time": datetime.now().isoformat(),
+            "topics": self.topics.copy() if self.topics else ["all"],
+            "zmq_endpoint": zmq_endpoint
         }
 
+        # Messages are streamed to disk as NDJSON, one line per message
+        self.file_path = self.output_dir / self.generate_filename()
+        # The fd is managed directly and written with os.writev, bypassing Python's buffering
+        self._fd = os.open(self.file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+        self._pending = []
+        self._pending_bytes = 0
+        self._topic_fields = {}  # topic bytes -> encoded '"topic":...,"data":' fragment
+        self._compressor = zstd.ZstdCompressor(level=3).compressobj() if compress == "zstd" else None
+        self.buffer_lines([orjson.dumps({"metadata": self.metadata}, option=orjson.OPT_APPEND_NEWLINE)])
+
         # Flag to control recording
         self.is_recording = False
-        self.poller = zmq.Poller()
-        self.poller.register(self.socket, zmq.POLLIN)
 
         # Register signal handlers for graceful shutdown
         signal.signal(signal.SIGINT, self.handle_shutdown)
@@ -66,12 +116,12 @@ class DataRecorder:
         """Set up ZMQ subscriptions based on topics."""
         if not self.topics:
             # Subscribe to all topics
-            self.socket.setsockopt_string(zmq.SUBSCRIBE, "")
+            self.socket.setsockopt(zmq.SUBSCRIBE, b"")
             logging.info("Subscribing to all topics")
         else:
             # Subscribe to specific topics
             for topic in self.topics:
-                self.socket.setsockopt_string(zmq.SUBSCRIBE, topic)
+                self.socket.setsockopt(zmq.SUBSCRIBE, topic.encode('utf-8') if isinstance(topic, str) else topic)
                 logging.info(f"Subscribing to topic: {topic}")
 
     def generate_filename(self):
@@ -80,75 +130,168 @@ class DataRecorder:
         topics_str = "_".join(self.topics) if self.topics else "all_topics"
         if len(topics_str) > 100:  # Limit filename length
             topics_str = topics_str[:97] + "..."
-        return f"cviz_recording_{timestamp}_{topics_str}.json"
+        extension = ".ndjson.zst" if self.compress == "zstd" else ".ndjson"
+        return f"cviz_recording_{timestamp}_{topics_str}{extension}"
 
     async def record(self):
         """Start recording data from ZMQ publishers."""
         self.is_recording = True
         start_time = time.time()
-        message_count = 0
+        self.message_count = 0
+
+        logging.info(f"Starting recording. Output will be saved to {self.file_path}")
 
-        logging.info(f"Starting recording. Output will be saved to {self.output_dir}")
+        self._stopped = asyncio.Event()
+        background_tasks = [asyncio.create_task(self.progress_loop())]
+        if self.sync_interval_ms > 0:
+            background_tasks.append(asyncio.create_task(self.sync_loop()))
 
         try:
             while self.is_recording:
-                # Poll for messages with a timeout
-                socks = dict(self.poller.poll(100))  # 100ms timeout
-
-                if self.socket in socks and socks[self.socket] == zmq.POLLIN:
-                    # Receive a multipart message: [topic, message]
-                    topic, message = self.socket.recv_multipart()
-                    topic_str = topic.decode('utf-8')
-                    data = json.loads(message.decode('utf-8'))
-
-                    # Add timestamp and store the message
-                    message_entry = {
-                        "timestamp": time.time(),
-                        "topic": topic_str,
-                        "data": data
-                    }
-                    self.recorded_data["messages"].append(message_entry)
-
-                    message_count += 1
-                    if message_count % 100 == 0:
-                        logging.info(
-                            f"Recorded {message_count} messages ({len(self.topics) if self.topics else 'all'} topics)")
-
-                # Yield control to allow other async operations
-                await asyncio.sleep(0.001)
+                # Wait for a message on the event loop, waking periodically to check the flags
+                try:
+                    batch = [await asyncio.wait_for(self.socket.recv_multipart(), timeout=0.1)]
+                except asyncio.TimeoutError:
+                    batch = []
+                else:
+                    # Drain everything already queued without waiting again
+                    while len(batch) < MAX_DRAIN:
+                        try:
+                            batch.append(await self.socket.recv_multipart(zmq.NOBLOCK))
+                        except zmq.Again:
+                            break
+
+                # The batch was drained in one go, so one clock read timestamps all of it
+                now = time.time()
+                line_start = b'{"timestamp":' + orjson.dumps(now)
+
+                lines = []
+
+                # Each message is a multipart message: [topic, message]
+                for topic, message in batch:
+                    topic_field = self._topic_fields.get(topic)
+                    if topic_field is None:
+                        topic_field = self._topic_fields[topic] = b',"topic":' + orjson.dumps(topic.decode('utf-8')) + b',"data":'
+
+                    if b'\n' in message:
+                        # Pretty-printed payloads are re-encoded onto one line
+                        try:
+                            message = orjson.dumps(orjson.loads(message))
+                        except orjson.JSONDecodeError as e:
+                            # One bad publisher must not end the recording
+                            logging.warning(f"Skipping invalid JSON message on {topic.decode('utf-8', errors='replace')}: {e}")
+                            continue
+
+                    # Store the payload verbatim; it is only parsed when played back
+                    lines.append(b''.join((line_start, topic_field, message, b'}\n')))
+
+                self.message_count += len(lines)
+
+                if lines:
+                    self.buffer_lines(lines)
+                elif self._pending:
+                    # Idle: don't hold a partial batch back while nothing arrives
+                    self.flush_pending()
+
+                # Only a full batch can leave more queued; otherwise the next recv waits anyway
+                if len(batch) == MAX_DRAIN:
+                    await asyncio.sleep(0)
 
         except Exception as e:
             logging.error(f"Error during recording: {e}")
         finally:
+            # Let an in-flight sync finish before the file is closed
+            self._stopped.set()
+            await asyncio.gather(*background_tasks)
+
             # Add recording metadata
             duration = time.time() - start_time
-            self.recorded_data["metadata"]["end_time"] = datetime.now().isoformat()
-            self.recorded_data["metadata"]["duration_seconds"] = duration
-            self.recorded_data["metadata"]["message_count"] = message_count
+            self.metadata["end_time"] = datetime.now().isoformat()
+            self.metadata["duration_seconds"] = duration
+            self.metadata["message_count"] = self.message_count
 
             # Save the recording
             self.save_recording()
-            logging.info(f"Recording stopped after {duration:.2f} seconds. Recorded {message_count} messages.")
+            logging.info(f"Recording stopped after {duration:.2f} seconds. Recorded {self.message_count} messages.")
+
+    async def progress_loop(self):
+        """Log the message count once a second, keeping progress reporting off the receive path."""
+        last_count = 0
+        while True:
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=1.0)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+            if self.message_count != last_count:
+                logging.info(f"Recorded {self.message_count} messages (+{self.message_count - last_count} this sec, "
+                             f"{len(self.topics) if self.topics else 'all'} topics)")
+                last_count = self.message_count
+
+    async def sync_loop(self):
+        """Periodically write out queued lines and sync them to disk off the event loop."""
+        interval = self.sync_interval_ms / 1000
+        while True:
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                self.flush_pending()
+                await asyncio.to_thread(_datasync, self._fd)
+            except OSError as e:
+                logging.error(f"Error syncing recording: {e}")
+
+    def buffer_lines(self, lines):
+        """Queue encoded NDJSON lines, writing them out once a batch limit is reached."""
+        self._pending.extend(lines)
+        self._pending_bytes += sum(map(len, lines))
+        if len(self._pending) >= DEFAULT_MAX_BATCH_SIZE or self._pending_bytes >= DEFAULT_MAX_BATCH_BYTES:
+            self.flush_pending()
+
+    def flush_pending(self):
+        """Write all queued lines with vectored writes."""
+        pending = self._pending
+        if self._compressor is not None:
+            # End the zstd block so everything written so far can be decompressed after a crash
+            self.write_all(self._compressor.compress(b''.join(pending)) +
+                           self._compressor.flush(zstd.COMPRESSOBJ_FLUSH_BLOCK))
+        else:
+            for start in range(0, len(pending), DEFAULT_MAX_BATCH_SIZE):
+                chunk = pending[start:start + DEFAULT_MAX_BATCH_SIZE]
+                written = os.writev(self._fd, chunk)
+                if written < sum(map(len, chunk)):
+                    # Short write: finish the rest of this chunk with plain writes
+                    self.write_all(memoryview(b''.join(chunk))[written:])
+        pending.clear()
+        self._pending_bytes = 0
+
+    def write_all(self, data):
+        """Write a buffer to the recording fd, retrying short writes."""
+        data = memoryview(data)
+        while data:
+            data = data[os.write(self._fd, data):]
 
     def save_recording(self):
-        """Save the recorded data to a file."""
-        filename = self.generate_filename()
-        file_path = self.output_dir / filename
+        """Write the final metadata line and close the recording file."""
+        if self._fd is None:
+            return
 
         try:
-            with open(file_path, 'w') as f:
-                json.dump(self.recorded_data, f, indent=2)
-            logging.info(f"Recording saved to {file_path}")
+            self.buffer_lines([orjson.dumps({"metadata": self.metadata}, option=orjson.OPT_APPEND_NEWLINE)])
+            self.flush_pending()
+            if self._compressor is not None:
+                self.write_all(self._compressor.flush())
+            _datasync(self._fd)
+            logging.info(f"Recording saved to {self.file_path}")
         except Exception as e:
             logging.error(f"Error saving recording: {e}")
-            # Try to save to a backup location
-            backup_path = Path(f"cviz_recording_backup_{int(time.time())}.json")
-            try:
-                with open(backup_path, 'w') as f:
-                    json.dump(self.recorded_data, f, indent=2)
-                logging.info(f"Backup recording saved to {backup_path}")
-            except Exception as backup_e:
-                logging.error(f"Error saving backup recording: {backup_e}")
+        finally:
+            os.close(self._fd)
+            self._fd = None
 
     def handle_shutdown(self, signum, frame):
         """Handle shutdown signals gracefully."""
@@ -157,9 +300,9 @@ class DataRecorder:
 
     def cleanup(self):
         """Clean up resources."""
+        self.save_recording()
         try:
             self.socket.close()
-            self.context.term()
             logging.info("ZMQ resources cleaned up")
         except Exception as e:
             logging.error(f"Error during cleanup: {e}")
@@ -171,6 +314,12 @@ async def main():
     parser.add_argument('--topics', type=str, help='Comma-separated list of topics to record')
     parser.add_argument('--endpoint', type=str, default=DEFAULT_ZMQ_ENDPOINT, help='ZMQ endpoint to connect to')
     parser.add_argument('--output-dir', type=str, default="recordings", help='Directory to save recordings')
+    parser.add_argument('--sync-interval-ms', type=int, default=DEFAULT_SYNC_INTERVAL_MS,
+                        help='Milliseconds between background disk syncs while recording (0 = only when stopping)')
+    parser.add_argument('--compress', choices=['none', 'zstd'], default='none',
+                        help='Compress the recording as it is written (zstd requires the zstandard package)')
+    parser.add_argument('--rcvhwm', type=int, default=DEFAULT_RCVHWM, help='ZMQ receive high-water mark (messages)')
+    parser.add_argument('--rcvbuf', type=int, default=DEFAULT_RCVBUF, help='Socket receive buffer size (bytes)')
     args = parser.parse_args()
 
     # Parse topics if provided
@@ -182,7 +331,11 @@ async def main():
     recorder = DataRecorder(
         topics=topics,
         zmq_endpoint=args.endpoint,
-        output_dir=args.output_dir
+        output_dir=args.output_dir,
+        sync_interval_ms=args.sync_interval_ms,
+        compress=args.compress,
+        rcvhwm=args.rcvhwm,
+        rcvbuf=args.rcvbuf
     )
 
     try:
@@ -192,4 +345,4 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run_main(main())
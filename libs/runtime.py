@@ -0,0 +1,15 @@
+import asyncio
+
+try:
+    # Optional: a faster event loop for the command-line tools
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+def run_main(coro):
+    """Run a command-line tool's main coroutine, on uvloop when it is installed."""
+    # uvloop.run (uvloop >= 0.18) replaces the deprecated uvloop.install()
+    if uvloop is not None and hasattr(uvloop, 'run'):
+        return uvloop.run(coro)
+    return asyncio.run(coro)
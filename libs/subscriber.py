@@ -1,73 +1,108 @@
 import os
 import time
 import zmq
-import json
+import zmq.asyncio
+import orjson
 import asyncio
 import logging
+from collections import deque
 
 DEFAULT_ZMQ_ENDPOINT = os.environ.get("CVIZ_ZMQ_ENDPOINT", "tcp://127.0.0.1:5555")
 
+# Receive queue sizes that absorb bursts without dropping messages
+DEFAULT_RCVHWM = 1_000_000
+DEFAULT_RCVBUF = 16 * 1024 * 1024
+
+# Upper bound on messages received per wakeup, so a flood cannot starve the event loop
+MAX_DRAIN = 1000
+
 class Subscriber:
     def __init__(self,
                  topic_name: str,
                  zmq_endpoint=None,
-                 msg_freq=40):
-        """Initialise Subscriber."""
-        
+                 msg_freq=40,
+                 rcvhwm=DEFAULT_RCVHWM,
+                 rcvbuf=DEFAULT_RCVBUF,
+                 raw=False,
+                 on_message=None):
+        """Initialise Subscriber.
+
+        With raw=True payloads are kept as JSON text instead of being parsed,
+        for consumers (like the websocket relay) that only forward them.
+        on_message, if given, is called as on_message(topic_name, data) for
+        every received message so consumers do not have to poll.
+        """
+
         self.topic = topic_name
+        self._topic_bytes = topic_name.encode('utf-8')
         self.zmq_endpoint = zmq_endpoint or DEFAULT_ZMQ_ENDPOINT
-        self.zmq_context = zmq.Context()
+        # Sockets come from the process-wide context, which must not be terminated here
+        self.zmq_context = zmq.asyncio.Context.instance()
         self.zmq_socket = self.zmq_context.socket(zmq.SUB)
+        self.zmq_socket.setsockopt(zmq.RCVHWM, rcvhwm)
+        self.zmq_socket.setsockopt(zmq.RCVBUF, rcvbuf)
         self.zmq_socket.connect(self.zmq_endpoint)
-        self.zmq_socket.setsockopt_string(zmq.SUBSCRIBE, topic_name)
-        self.received_messages = []
+        self.zmq_socket.setsockopt(zmq.SUBSCRIBE, self._topic_bytes)
+        self.received_messages = deque(maxlen=10)
         self.msg_freq = msg_freq  # Frequency of messages to receive
+        self.raw = raw
+        self.on_message = on_message
         
+    def close(self):
+        """Close this subscriber's socket; the shared context stays alive."""
+        self.zmq_socket.close(linger=0)
+
     def get_message(self):
         """Get the latest message."""
-        if self.received_messages:
-            return self.received_messages[-1]
-        else:
-            return None
+        return self.received_messages[-1] if self.received_messages else None
 
     async def subscribe(self):    
         """Subscribe to the ZMQ socket."""
-        poller = zmq.Poller()
-        poller.register(self.zmq_socket, zmq.POLLIN)
-
         counter = 0
 
         while True:
             try:
-                # Non-blocking poll for messages
-                socks = dict(poller.poll(1))  # 1ms timeout
-                
-                if self.zmq_socket in socks and socks[self.zmq_socket] == zmq.POLLIN:
-                    # Receive a multipart message: [topic, message]
-                    topic, message = self.zmq_socket.recv_multipart()
-                    topic = topic.decode('utf-8')
-                    data = json.loads(message.decode('utf-8'))
-
-                    if counter % self.msg_freq == 0:
-                        logging.info(f"Received message: {topic}")
+                # Wait on the event loop until libzmq signals a message
+                batch = [await self.zmq_socket.recv_multipart()]
+
+                # Drain everything already queued without waiting again
+                while len(batch) < MAX_DRAIN:
+                    try:
+                        batch.append(await self.zmq_socket.recv_multipart(zmq.NOBLOCK))
+                    except zmq.Again:
+                        break
+            except Exception as e:
+                logging.error(f"Error in ZMQ listener: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            # Each message is a multipart message: [topic, message]
+            for topic, message in batch:
+                # SUBSCRIBE is a prefix match; drop longer topic names (e.g. "points"
+                # on a "point" subscriber) here rather than misattributing them
+                if topic != self._topic_bytes and self._topic_bytes:
+                    continue
+
+                # A bad payload or failing callback only skips that one message
+                try:
+                    data = message.decode('utf-8') if self.raw else orjson.loads(message)
+
+                    if counter % self.msg_freq == 0 and logging.root.isEnabledFor(logging.INFO):
+                        logging.info(f"Received message: {topic.decode('utf-8')}")
                         logging.debug(f"{data}")
 
                     self.received_messages.append(data)
-                    if len(self.received_messages) > 10:
-                        self.received_messages.pop(0)
+                    if self.on_message is not None:
+                        self.on_message(self.topic, data)
+                except Exception as e:
+                    logging.error(f"Error handling message on {self.topic}: {e}")
 
-                    counter += 1
-
-                # Yield control to allow other async operations
-                await asyncio.sleep(0)
-                
+                counter += 1
 
-            except zmq.Again:
-                # No message available, just continue
+            # The awaited recv is the yield point when idle; a full batch means
+            # more is queued and recv would return at once, so yield explicitly
+            if len(batch) == MAX_DRAIN:
                 await asyncio.sleep(0)
-            except Exception as e:
-                logging.error(f"Error in ZMQ listener: {e}")
-                await asyncio.sleep(1)
 
 
 # test
@@ -80,5 +115,11 @@ async def main():
     
     
 if __name__ == "__main__":
-    asyncio.run(main())
+    import sys
+    from pathlib import Path
+
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    from libs.runtime import run_main
+
+    run_main(main())
 
@@ -2,27 +2,46 @@
 import os
 import argparse
 import asyncio
-import json
 import time
+import orjson
 import zmq
+import zmq.asyncio
 import signal
 from datetime import datetime
 from typing import Dict, Optional
 import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from libs.runtime import run_main
 
 DEFAULT_ZMQ_ENDPOINT = os.environ.get("CVIZ_ZMQ_ENDPOINT", "tcp://127.0.0.1:5555")
 
+# Receive queue sizes that absorb bursts without dropping messages
+DEFAULT_RCVHWM = 1_000_000
+DEFAULT_RCVBUF = 16 * 1024 * 1024
+
+# Upper bound on messages received per wakeup, so a flood cannot starve the event loop
+MAX_DRAIN = 1000
+
 
 class TopicEcho:
     """Echo messages from a specific topic, similar to rostopic echo."""
 
-    def __init__(self, topic: str, zmq_endpoint=DEFAULT_ZMQ_ENDPOINT):
+    def __init__(self, topic: str, zmq_endpoint=DEFAULT_ZMQ_ENDPOINT, rcvhwm=DEFAULT_RCVHWM, rcvbuf=DEFAULT_RCVBUF):
         self.topic = topic
+        self._topic_bytes = topic.encode('utf-8')
         self.zmq_endpoint = zmq_endpoint
-        self.context = zmq.Context()
+        # Sockets come from the process-wide context, which must not be terminated here
+        self.context = zmq.asyncio.Context.instance()
         self.socket = self.context.socket(zmq.SUB)
+        self.socket.setsockopt(zmq.RCVHWM, rcvhwm)
+        self.socket.setsockopt(zmq.RCVBUF, rcvbuf)
         self.socket.connect(self.zmq_endpoint)
-        self.socket.setsockopt_string(zmq.SUBSCRIBE, topic)
+        self.socket.setsockopt(zmq.SUBSCRIBE, self._topic_bytes)
+
+        # Decoded topic names by raw topic frame, so each name is decoded once
+        self._topic_names = {}
 
         # Statistics
         self.message_count = 0
@@ -33,36 +52,53 @@ class TopicEcho:
         signal.signal(signal.SIGINT, self.handle_shutdown)
         signal.signal(signal.SIGTERM, self.handle_shutdown)
 
-        # Poller for non-blocking operations
-        self.poller = zmq.Poller()
-        self.poller.register(self.socket, zmq.POLLIN)
-
     def handle_shutdown(self, signum, frame):
         """Handle shutdown signals gracefully."""
         print(f"\n[INFO] Received signal {signum}, shutting down...")
         self.running = False
 
+    def topic_name(self, topic_bytes: bytes) -> str:
+        """Return the decoded topic name, decoding each distinct topic only once."""
+        topic = self._topic_names.get(topic_bytes)
+        if topic is None:
+            topic = self._topic_names[topic_bytes] = topic_bytes.decode('utf-8')
+        return topic
+
     def format_yaml_like(self, data: Dict, indent: int = 0) -> str:
         """Format data in a YAML-like format similar to ROS."""
-        result = []
         indent_str = "  " * indent
+        if not isinstance(data, (dict, list)):
+            return f"{indent_str}{data}"
 
-        if isinstance(data, dict):
-            for key, value in data.items():
-                if isinstance(value, (dict, list)):
+        # Walk the document with an explicit stack of iterators, appending every
+        # line to one list so the output is joined exactly once
+        result = []
+        stack = [(iter(data.items()) if isinstance(data, dict) else iter(data), indent_str, isinstance(data, dict))]
+        while stack:
+            entries, indent_str, is_dict = stack[-1]
+            for entry in entries:
+                if is_dict:
+                    key, value = entry
+                    if not isinstance(value, (dict, list)):
+                        result.append(f"{indent_str}{key}: {value}")
+                        continue
                     result.append(f"{indent_str}{key}:")
-                    result.append(self.format_yaml_like(value, indent + 1))
                 else:
-                    result.append(f"{indent_str}{key}: {value}")
-        elif isinstance(data, list):
-            for i, item in enumerate(data):
-                result.append(f"{indent_str}- ")
-                if isinstance(item, (dict, list)):
-                    result.append(self.format_yaml_like(item, indent + 1))
-                else:
-                    result.append(f"  {item}")
-        else:
-            result.append(f"{indent_str}{data}")
+                    value = entry
+                    result.append(f"{indent_str}- ")
+                    if not isinstance(value, (dict, list)):
+                        result.append(f"  {value}")
+                        continue
+
+                if not value:
+                    # An empty nested container renders as an empty line
+                    result.append("")
+                    continue
+                value_is_dict = isinstance(value, dict)
+                stack.append((iter(value.items()) if value_is_dict else iter(value), indent_str + "  ", value_is_dict))
+                break
+            else:
+                stack.pop()
 
         return "\n".join(result)
 
@@ -78,40 +114,52 @@ class TopicEcho:
 
         try:
             while self.running:
-                socks = dict(self.poller.poll(100))
-
-                if self.socket in socks and socks[self.socket] == zmq.POLLIN:
-                    try:
-                        topic_bytes, message_bytes = self.socket.recv_multipart(zmq.NOBLOCK)
-                        topic = topic_bytes.decode('utf-8')
-
-                        # Parse the message
+                # Wait for a message on the event loop, waking periodically to check the flag
+                try:
+                    batch = [await asyncio.wait_for(self.socket.recv_multipart(), timeout=0.1)]
+                except asyncio.TimeoutError:
+                    batch = []
+                else:
+                    # Drain everything already queued without waiting again
+                    while len(batch) < MAX_DRAIN:
                         try:
-                            data = json.loads(message_bytes.decode('utf-8'))
-                        except json.JSONDecodeError:
-                            print(f"[WARNING] Could not decode message as JSON")
-                            continue
+                            batch.append(await self.socket.recv_multipart(zmq.NOBLOCK))
+                        except zmq.Again:
+                            break
+
+                # Format the receive time once per drained batch
+                if batch:
+                    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
 
-                        # Filter if requested
-                        if filter_field and filter_field in data:
-                            data = {filter_field: data[filter_field]}
+                for topic_bytes, message_bytes in batch:
+                    # SUBSCRIBE is a prefix match, so skip longer topic names
+                    # (an empty topic subscribes to everything)
+                    if self._topic_bytes and topic_bytes != self._topic_bytes:
+                        continue
 
-                        # Display message
-                        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-                        print(f"--- Topic: {topic} [{timestamp}] ---")
+                    # Parse the message
+                    try:
+                        data = orjson.loads(message_bytes)
+                    except orjson.JSONDecodeError:
+                        print(f"[WARNING] Could not decode message as JSON")
+                        continue
 
-                        if output_format == "yaml":
-                            print(self.format_yaml_like(data))
-                        else:  # json
-                            print(json.dumps(data, indent=2))
+                    # Filter if requested
+                    if filter_field and filter_field in data:
+                        data = {filter_field: data[filter_field]}
 
-                        print("---")
-                        self.message_count += 1
+                    # Display message
+                    if output_format == "yaml":
+                        body = self.format_yaml_like(data)
+                    else:  # json
+                        body = orjson.dumps(data, option=orjson.OPT_INDENT_2).decode('utf-8')
 
-                    except zmq.Again:
-                        pass
+                    sys.stdout.write(f"--- Topic: {self.topic_name(topic_bytes)} [{timestamp}] ---\n{body}\n---\n")
+                    self.message_count += 1
 
-                await asyncio.sleep(0.01)
+                # Only a full batch can leave more queued; otherwise the next recv waits anyway
+                if len(batch) == MAX_DRAIN:
+                    await asyncio.sleep(0)
 
         except KeyboardInterrupt:
             pass
@@ -124,7 +172,6 @@ class TopicEcho:
         """Clean up resources."""
         try:
             self.socket.close()
-            self.context.term()
         except Exception as e:
             print(f"[WARNING] Error during cleanup: {e}")
 
@@ -134,13 +181,15 @@ async def main():
     parser.add_argument('topic', type=str, help='Topic name to echo')
     parser.add_argument('--endpoint', '-e', type=str, default=DEFAULT_ZMQ_ENDPOINT,
                         help='ZMQ endpoint to connect to')
+    parser.add_argument('--rcvhwm', type=int, default=DEFAULT_RCVHWM, help='ZMQ receive high-water mark (messages)')
+    parser.add_argument('--rcvbuf', type=int, default=DEFAULT_RCVBUF, help='Socket receive buffer size (bytes)')
     parser.add_argument('--format', '-f', choices=['yaml', 'json'], default='yaml',
                         help='Output format')
     parser.add_argument('--field', type=str, help='Show only specific field from messages')
 
     args = parser.parse_args()
 
-    echo_tool = TopicEcho(topic=args.topic, zmq_endpoint=args.endpoint)
+    echo_tool = TopicEcho(topic=args.topic, zmq_endpoint=args.endpoint, rcvhwm=args.rcvhwm, rcvbuf=args.rcvbuf)
 
     try:
         await echo_tool.echo(output_format=args.format, filter_field=args.field)
@@ -150,6 +199,6 @@ async def main():
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        run_main(main())
     except KeyboardInterrupt:
         print("\n[INFO] Interrupted by user")
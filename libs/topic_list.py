@@ -2,24 +2,60 @@
 import os
 import argparse
 import asyncio
-import json
 import time
+import orjson
 import zmq
+import zmq.asyncio
 from collections import defaultdict
 from datetime import datetime
+from operator import itemgetter
+from typing import Optional
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from libs.runtime import run_main
+
+# Optional parsers that read data_type without building the whole message,
+# preferred in this order over a full orjson parse
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import cysimdjson
+except ImportError:
+    cysimdjson = None
 
 DEFAULT_ZMQ_ENDPOINT = os.environ.get("CVIZ_ZMQ_ENDPOINT", "tcp://127.0.0.1:5555")
 
+# Receive queue sizes that absorb bursts without dropping messages
+DEFAULT_RCVHWM = 1_000_000
+DEFAULT_RCVBUF = 16 * 1024 * 1024
+
+# Upper bound on messages received per wakeup, so a flood cannot starve the event loop
+MAX_DRAIN = 1000
+
+
+if msgspec is not None:
+    class _TopicMeta(msgspec.Struct):
+        """The only message field TopicLister reads; msgspec skips everything else."""
+        data_type: Optional[str] = None
+
 
 class TopicLister:
     """List available topics with their information."""
 
-    def __init__(self, zmq_endpoint=DEFAULT_ZMQ_ENDPOINT):
+    def __init__(self, zmq_endpoint=DEFAULT_ZMQ_ENDPOINT, rcvhwm=DEFAULT_RCVHWM, rcvbuf=DEFAULT_RCVBUF):
         self.zmq_endpoint = zmq_endpoint
-        self.context = zmq.Context()
+        # Sockets come from the process-wide context, which must not be terminated here
+        self.context = zmq.asyncio.Context.instance()
         self.socket = self.context.socket(zmq.SUB)
+        self.socket.setsockopt(zmq.RCVHWM, rcvhwm)
+        self.socket.setsockopt(zmq.RCVBUF, rcvbuf)
         self.socket.connect(self.zmq_endpoint)
-        self.socket.setsockopt_string(zmq.SUBSCRIBE, "")  # Subscribe to all topics
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")  # Subscribe to all topics
 
         self.topic_info = defaultdict(lambda: {
             'count': 0,
@@ -29,8 +65,20 @@ class TopicLister:
             'total_size': 0
         })
 
-        self.poller = zmq.Poller()
-        self.poller.register(self.socket, zmq.POLLIN)
+        self._decoder = msgspec.json.Decoder(_TopicMeta) if msgspec else None
+        self._parser = cysimdjson.JSONParser() if cysimdjson else None
+
+    def extract_data_type(self, message_bytes):
+        """Return the message's data_type field, or None if it is missing or unparsable."""
+        try:
+            if self._decoder is not None:
+                return self._decoder.decode(message_bytes).data_type
+            if self._parser is not None:
+                return self._parser.parse(message_bytes).at_pointer('/data_type')
+            data = orjson.loads(message_bytes)
+            return data.get('data_type') if isinstance(data, dict) else None
+        except Exception:
+            return None
 
     async def scan_topics(self, duration=5, show_progress=True):
         """Scan for topics for the specified duration."""
@@ -40,30 +88,32 @@ class TopicLister:
         last_progress = 0
 
         while time.time() - start_time < duration:
-            socks = dict(self.poller.poll(100))
-
-            if self.socket in socks and socks[self.socket] == zmq.POLLIN:
-                try:
-                    topic_bytes, message_bytes = self.socket.recv_multipart(zmq.NOBLOCK)
-                    topic = topic_bytes.decode('utf-8')
-
-                    # Update statistics
-                    info = self.topic_info[topic]
-                    info['count'] += 1
-                    info['last_seen'] = time.time()
-                    info['total_size'] += len(message_bytes)
-                    info['avg_size'] = info['total_size'] / info['count']
-
-                    # Try to extract data type
+            # Wait for a message on the event loop, waking periodically to update progress
+            try:
+                batch = [await asyncio.wait_for(self.socket.recv_multipart(), timeout=0.1)]
+            except asyncio.TimeoutError:
+                batch = []
+            else:
+                # Drain everything already queued without waiting again
+                while len(batch) < MAX_DRAIN:
                     try:
-                        data = json.loads(message_bytes.decode('utf-8'))
-                        if 'data_type' in data:
-                            info['data_type'] = data['data_type']
-                    except:
-                        pass
-
-                except zmq.Again:
-                    pass
+                        batch.append(await self.socket.recv_multipart(zmq.NOBLOCK))
+                    except zmq.Again:
+                        break
+
+            now = time.time()
+            for topic_bytes, message_bytes in batch:
+                # Keyed by the raw topic bytes; names are decoded once for display
+                info = self.topic_info[topic_bytes]
+                info['count'] += 1
+                info['last_seen'] = now
+                info['total_size'] += len(message_bytes)
+                info['avg_size'] = info['total_size'] / info['count']
+
+                # Try to extract data type
+                data_type = self.extract_data_type(message_bytes)
+                if data_type is not None:
+                    info['data_type'] = data_type
 
             # Show progress
             if show_progress:
@@ -73,7 +123,9 @@ class TopicLister:
                     print(f"\rProgress: {progress}% ({len(self.topic_info)} topics found)", end='', flush=True)
                     last_progress = progress
 
-            await asyncio.sleep(0.01)
+            # Only a full batch can leave more queued; otherwise the next recv waits anyway
+            if len(batch) == MAX_DRAIN:
+                await asyncio.sleep(0)
 
         if show_progress:
             print()  # New line after progress
@@ -84,42 +136,44 @@ class TopicLister:
         print("DISCOVERED TOPICS")
         print("=" * 80)
 
+        # Build (name, type, count, info) rows once so sorting uses plain itemgetter keys
+        rows = [(topic.decode('utf-8', errors='replace'), info['data_type'] or 'unknown', info['count'], info)
+                for topic, info in self.topic_info.items()]
+
         # Filter by type if requested
-        topics_to_show = self.topic_info.items()
         if filter_type:
-            topics_to_show = [(topic, info) for topic, info in topics_to_show
-                              if info.get('data_type') == filter_type]
+            rows = [row for row in rows if row[1] == filter_type]
 
         # Sort topics
         if sort_by == 'name':
-            topics_to_show = sorted(topics_to_show, key=lambda x: x[0])
+            rows.sort(key=itemgetter(0))
         elif sort_by == 'count':
-            topics_to_show = sorted(topics_to_show, key=lambda x: x[1]['count'], reverse=True)
+            rows.sort(key=itemgetter(2), reverse=True)
         elif sort_by == 'type':
-            topics_to_show = sorted(topics_to_show, key=lambda x: x[1].get('data_type', 'unknown'))
+            rows.sort(key=itemgetter(1))
 
         # Display header
         print(f"{'Topic Name':<25} {'Type':<15} {'Count':<8} {'Avg Size':<10} {'Rate (Hz)':<10} {'Last Seen'}")
         print("-" * 80)
 
         current_time = time.time()
-        for topic, info in topics_to_show:
+        for topic, data_type, count, info in rows:
             # Calculate rate
             if info['last_seen']:
-                rate = info['count'] / max(1, info['last_seen'] - (current_time - 5))
+                rate = count / max(1, info['last_seen'] - (current_time - 5))
                 last_seen = datetime.fromtimestamp(info['last_seen']).strftime("%H:%M:%S")
             else:
                 rate = 0
                 last_seen = "Never"
 
-            print(f"{topic:<25} {info.get('data_type', 'unknown'):<15} "
-                  f"{info['count']:<8} {info['avg_size']:<10.1f} "
+            print(f"{topic:<25} {data_type:<15} "
+                  f"{count:<8} {info['avg_size']:<10.1f} "
                   f"{rate:<10.1f} {last_seen}")
 
-        print(f"\nTotal: {len(topics_to_show)} topics")
+        print(f"\nTotal: {len(rows)} topics")
 
         # Show unique data types
-        data_types = set(info.get('data_type') for _, info in self.topic_info.items() if info.get('data_type'))
+        data_types = {info['data_type'] for info in self.topic_info.values() if info['data_type']}
         if data_types:
             print(f"Data Types: {', '.join(sorted(data_types))}")
 
@@ -127,7 +181,6 @@ class TopicLister:
         """Clean up resources."""
         try:
             self.socket.close()
-            self.context.term()
         except Exception as e:
             print(f"[WARNING] Error during cleanup: {e}")
 
@@ -136,6 +189,8 @@ async def main():
     parser = argparse.ArgumentParser(description='List available topics')
     parser.add_argument('--endpoint', '-e', type=str, default=DEFAULT_ZMQ_ENDPOINT,
                         help='ZMQ endpoint to connect to')
+    parser.add_argument('--rcvhwm', type=int, default=DEFAULT_RCVHWM, help='ZMQ receive high-water mark (messages)')
+    parser.add_argument('--rcvbuf', type=int, default=DEFAULT_RCVBUF, help='Socket receive buffer size (bytes)')
     parser.add_argument('--duration', '-d', type=int, default=5,
                         help='Duration to scan for topics (seconds)')
     parser.add_argument('--sort', '-s', choices=['name', 'count', 'type'], default='name',
@@ -147,7 +202,7 @@ async def main():
 
     args = parser.parse_args()
 
-    lister = TopicLister(zmq_endpoint=args.endpoint)
+    lister = TopicLister(zmq_endpoint=args.endpoint, rcvhwm=args.rcvhwm, rcvbuf=args.rcvbuf)
 
     try:
         await lister.scan_topics(duration=args.duration, show_progress=not args.no_progress)
@@ -158,6 +213,6 @@ async def main():
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        run_main(main())
     except KeyboardInterrupt:
         print("\n[INFO] Interrupted by user")
@@ -1,27 +1,55 @@
 # topic_monitor.py
 import os
 import argparse
+import re
 import asyncio
 import json
 import time
+import functools
+import orjson
 import zmq
+import zmq.asyncio
 import signal
 import sys
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 from collections import defaultdict
 import logging
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from libs.runtime import run_main
 
 DEFAULT_ZMQ_ENDPOINT = os.environ.get("CVIZ_ZMQ_ENDPOINT", "tcp://127.0.0.1:5555")
 
+# Upper bound on messages received per wakeup, so a flood cannot starve the event loop
+MAX_DRAIN = 1000
+
+# Distinct payloads whose parsed and formatted form is kept for reuse
+FORMAT_CACHE_SIZE = 256
+
+# Top-level fields shown in the compact message summary
+SUMMARY_KEYS = ('id', 'type', 'color', 'velocity', 'count')
+
+# Leading data_type field of the envelope Publisher.serialize() writes first;
+# payloads that don't start with it are parsed instead
+DATA_TYPE_RE = re.compile(rb'\{\s*"data_type"\s*:\s*"([^"\\]*)"')
+
+# Display encoders, built once; json.dumps with options creates a new encoder per call
+encode_verbose = json.JSONEncoder(indent=2, sort_keys=True, ensure_ascii=False).encode
+encode_summary = json.JSONEncoder(indent=1, ensure_ascii=False).encode
+
 
 class TopicMonitor:
     """A command-line tool to monitor topics published via ZMQ."""
 
-    def __init__(self, zmq_endpoint=DEFAULT_ZMQ_ENDPOINT, verbose=False):
+    def __init__(self, zmq_endpoint=DEFAULT_ZMQ_ENDPOINT, verbose=False, display_hz=None):
         self.zmq_endpoint = zmq_endpoint
         self.verbose = verbose
-        self.context = zmq.Context()
+        # Minimum seconds between displayed messages per topic (None shows every message)
+        self.display_interval = 1.0 / display_hz if display_hz else None
+        # Sockets come from the process-wide context, which must not be terminated here
+        self.context = zmq.asyncio.Context.instance()
         self.socket = self.context.socket(zmq.SUB)
         self.socket.connect(self.zmq_endpoint)
 
@@ -32,7 +60,20 @@ class TopicMonitor:
             'data_type': None,
             'size_bytes': 0
         })
-        self.last_messages = {}
+        self.last_messages = {}  # last displayed message per topic
+        self._last_display = {}  # topic -> receive time of its last displayed message
+
+        # Decoded topic names by raw topic frame, so each name is decoded once
+        self._topic_names = {}
+
+        # (second, "HH:MM:SS") of the last formatted receive time
+        self._time_cache = (None, '')
+
+        # Display formatter per data_type, chosen on first sight of each type
+        self._formatters: Dict[Optional[str], Callable[[dict], str]] = {}
+
+        # Static publishers resend identical payloads, so cache parse + format by raw bytes
+        self._parse_and_format = functools.lru_cache(maxsize=FORMAT_CACHE_SIZE)(self._parse_and_format)
 
         # Control flags
         self.running = False
@@ -43,10 +84,6 @@ class TopicMonitor:
         signal.signal(signal.SIGINT, self.handle_shutdown)
         signal.signal(signal.SIGTERM, self.handle_shutdown)
 
-        # Create poller for non-blocking message receiving
-        self.poller = zmq.Poller()
-        self.poller.register(self.socket, zmq.POLLIN)
-
     def handle_shutdown(self, signum, frame):
         """Handle shutdown signals gracefully."""
         print("\n[INFO] Shutting down topic monitor...")
@@ -66,6 +103,28 @@ class TopicMonitor:
                 self.socket.setsockopt_string(zmq.SUBSCRIBE, topic)
                 print(f"[INFO] Subscribing to topic: {topic}")
 
+    def topic_name(self, topic_bytes: bytes) -> str:
+        """Return the decoded topic name, decoding each distinct topic only once."""
+        topic = self._topic_names.get(topic_bytes)
+        if topic is None:
+            topic = self._topic_names[topic_bytes] = topic_bytes.decode('utf-8')
+        return topic
+
+    async def receive_batch(self, limit: int = MAX_DRAIN):
+        """Wait briefly for a message, then drain whatever else is already queued."""
+        # Waiting happens on the event loop; the timeout lets callers check their flags
+        try:
+            batch = [await asyncio.wait_for(self.socket.recv_multipart(), timeout=0.1)]
+        except asyncio.TimeoutError:
+            return []
+
+        while len(batch) < limit:
+            try:
+                batch.append(await self.socket.recv_multipart(zmq.NOBLOCK))
+            except zmq.Again:
+                break
+        return batch
+
     async def list_topics(self, duration=3):
         """List all available topics for a specified duration."""
         print(f"[INFO] Scanning for topics for {duration} seconds...")
@@ -73,26 +132,16 @@ class TopicMonitor:
 
         start_time = time.time()
         while time.time() - start_time < duration:
-            socks = dict(self.poller.poll(100))
-
-            if self.socket in socks and socks[self.socket] == zmq.POLLIN:
-                try:
-                    topic_bytes, message_bytes = self.socket.recv_multipart(zmq.NOBLOCK)
-                    topic = topic_bytes.decode('utf-8')
-                    discovered_topics.add(topic)
+            batch = await self.receive_batch()
+            for topic_bytes, message_bytes in batch:
+                topic = self.topic_name(topic_bytes)
+                discovered_topics.add(topic)
 
-                    # Try to parse the message to get data type
-                    try:
-                        data = json.loads(message_bytes.decode('utf-8'))
-                        data_type = data.get('data_type', 'unknown')
-                        self.topic_stats[topic]['data_type'] = data_type
-                    except:
-                        pass
+                self.topic_stats[topic]['data_type'] = self.extract_data_type(message_bytes) or 'unknown'
 
-                except zmq.Again:
-                    pass
-
-            await asyncio.sleep(0.01)
+            # Only a full batch can leave more queued; otherwise the next recv waits anyway
+            if len(batch) == MAX_DRAIN:
+                await asyncio.sleep(0)
 
         # Display discovered topics
         print("\n[INFO] Discovered topics:")
@@ -106,42 +155,98 @@ class TopicMonitor:
 
         print(f"\nTotal: {len(discovered_topics)} topics")
 
+    def format_time(self, timestamp: float) -> str:
+        """Format a receive time as HH:MM:SS.mmm, reusing the formatted second."""
+        # Round to whole microseconds the way datetime.fromtimestamp does
+        sec = int(timestamp)
+        usec = round((timestamp - sec) * 1e6)
+        if usec >= 1_000_000:
+            sec += 1
+            usec -= 1_000_000
+        if sec != self._time_cache[0]:
+            self._time_cache = (sec, time.strftime("%H:%M:%S", time.localtime(sec)))
+        return f"{self._time_cache[1]}.{usec // 1000:03d}"
+
+    def extract_data_type(self, message_bytes: bytes) -> Optional[str]:
+        """Return the top-level data_type, scanning the envelope before parsing."""
+        match = DATA_TYPE_RE.match(message_bytes)
+        if match:
+            return match.group(1).decode('utf-8')
+
+        # Foreign or re-encoded payloads may put data_type later (or nest it)
+        try:
+            data = orjson.loads(message_bytes)
+        except orjson.JSONDecodeError:
+            return None
+        data_type = data.get('data_type') if isinstance(data, dict) else None
+        return data_type if isinstance(data_type, str) else None
+
+    def _parse_and_format(self, message_bytes: bytes):
+        """Parse a raw payload and format it for display; returns (data, text)."""
+        try:
+            data = orjson.loads(message_bytes)
+        except orjson.JSONDecodeError:
+            data = {'raw': message_bytes.decode('utf-8', errors='replace')}
+        return data, self.format_message(None, data, None)
+
     def format_message(self, topic: str, data: dict, timestamp: float) -> str:
         """Format a message for display."""
+        data_type = data.get('data_type')
+        if not isinstance(data_type, str):
+            data_type = None
+
+        # data_type is stable per topic, so the branching is resolved once per type
+        formatter = self._formatters.get(data_type)
+        if formatter is None:
+            formatter = self._formatters[data_type] = self._select_formatter(data_type)
+        return formatter(data)
+
+    def _select_formatter(self, data_type: Optional[str]) -> Callable[[dict], str]:
+        """Pick the display formatter for messages of the given data type."""
         if self.verbose:
-            # Show full message
-            return json.dumps(data, indent=2, sort_keys=True)
-        else:
-            # Show compact version
+            return self._format_verbose
+        if data_type == 'GeoJSON':
+            return self._format_geojson
+        return self._format_summary
+
+    def _format_verbose(self, data: dict) -> str:
+        """Show the full message."""
+        return encode_verbose(data)
+
+    def _format_summary(self, data: dict, summary: Optional[dict] = None) -> str:
+        """Show a compact version with the key fields only."""
+        if summary is None:
             summary = {}
-
-            # Add key information
             if 'data_type' in data:
                 summary['data_type'] = data['data_type']
 
-            # For GeoJSON data, show geometry type and coordinates count
-            if data.get('data_type') == 'GeoJSON':
-                geojson = data.get('geojson', data)
-                if geojson.get('type'):
-                    summary['geojson_type'] = geojson['type']
+        # Show other relevant fields
+        for key in SUMMARY_KEYS:
+            if key in data:
+                summary[key] = data[key]
+
+        return encode_summary(summary)
+
+    def _format_geojson(self, data: dict) -> str:
+        """Compact version for GeoJSON, with geometry type and coordinate counts."""
+        summary = {'data_type': 'GeoJSON'}
 
-                    # Count coordinates/features
-                    if 'coordinates' in geojson:
-                        if isinstance(geojson['coordinates'], list):
-                            summary['coord_points'] = len(geojson['coordinates'])
-                    elif 'features' in geojson:
-                        summary['features'] = len(geojson['features'])
+        geojson = data.get('geojson', data)
+        if geojson.get('type'):
+            summary['geojson_type'] = geojson['type']
 
-                # Show properties if available
-                if 'properties' in geojson and geojson['properties']:
-                    summary['properties'] = geojson['properties']
+            # Count coordinates/features
+            if 'coordinates' in geojson:
+                if isinstance(geojson['coordinates'], list):
+                    summary['coord_points'] = len(geojson['coordinates'])
+            elif 'features' in geojson:
+                summary['features'] = len(geojson['features'])
 
-            # Show other relevant fields
-            for key in ['id', 'type', 'color', 'velocity', 'count']:
-                if key in data:
-                    summary[key] = data[key]
+        # Show properties if available
+        if 'properties' in geojson and geojson['properties']:
+            summary['properties'] = geojson['properties']
 
-            return json.dumps(summary, indent=1)
+        return self._format_summary(data, summary)
 
     def display_stats(self):
         """Display topic statistics."""
@@ -174,43 +279,57 @@ class TopicMonitor:
 
         try:
             while self.running and (max_messages is None or message_count < max_messages):
-                socks = dict(self.poller.poll(100))
+                limit = MAX_DRAIN if max_messages is None else min(MAX_DRAIN, max_messages - message_count)
+                output = []
+
+                batch = await self.receive_batch(limit)
+
+                # One receive time per drained batch
+                timestamp = time.time()
+
+                for topic_bytes, message_bytes in batch:
+                    topic = self.topic_name(topic_bytes)
 
-                if self.socket in socks and socks[self.socket] == zmq.POLLIN:
-                    try:
-                        topic_bytes, message_bytes = self.socket.recv_multipart(zmq.NOBLOCK)
-                        topic = topic_bytes.decode('utf-8')
-                        timestamp = time.time()
+                    # Statistics are updated for every message
+                    stats = self.topic_stats[topic]
+                    stats['count'] += 1
+                    stats['last_seen'] = timestamp
+                    stats['size_bytes'] += len(message_bytes)
 
-                        # Parse message
-                        try:
-                            data = json.loads(message_bytes.decode('utf-8'))
-                        except json.JSONDecodeError:
-                            data = {'raw': message_bytes.decode('utf-8', errors='replace')}
+                    if (self.display_interval is not None
+                            and timestamp - self._last_display.get(topic, 0.0) < self.display_interval):
+                        # Not displayed; only the data type is needed to keep stats current
+                        data_type = self.extract_data_type(message_bytes)
+                        if data_type is not None:
+                            stats['data_type'] = data_type
+                        continue
+                    self._last_display[topic] = timestamp
 
-                        # Update statistics
-                        self.topic_stats[topic]['count'] += 1
-                        self.topic_stats[topic]['last_seen'] = timestamp
-                        self.topic_stats[topic]['size_bytes'] += len(message_bytes)
+                    # Parse and format message (cached for repeated payloads)
+                    data, text = self._parse_and_format(message_bytes)
 
-                        if 'data_type' in data:
-                            self.topic_stats[topic]['data_type'] = data['data_type']
+                    if 'data_type' in data:
+                        stats['data_type'] = data['data_type']
 
-                        # Store last message
-                        self.last_messages[topic] = data
+                    # Store last message
+                    self.last_messages[topic] = data
 
-                        # Display message
-                        dt_str = datetime.fromtimestamp(timestamp).strftime("%H:%M:%S.%f")[:-3]
-                        print(f"\n--- {topic} [{dt_str}] ---")
-                        print(self.format_message(topic, data, timestamp))
-                        print("-" * 50)
+                    # Queue the message for display
+                    dt_str = self.format_time(timestamp)
+                    output.append(f"\n--- {topic} [{dt_str}] ---\n"
+                                  f"{text}\n"
+                                  f"{'-' * 50}\n")
 
-                        message_count += 1
+                    message_count += 1
 
-                    except zmq.Again:
-                        pass
+                # One terminal write per drained batch
+                if output:
+                    sys.stdout.write(''.join(output))
+                    sys.stdout.flush()
 
-                await asyncio.sleep(0.01)
+                # Only a full batch can leave more queued; otherwise the next recv waits anyway
+                if len(batch) == limit:
+                    await asyncio.sleep(0)
 
         except KeyboardInterrupt:
             pass
@@ -221,7 +340,6 @@ class TopicMonitor:
         """Clean up resources."""
         try:
             self.socket.close()
-            self.context.term()
             print("[INFO] Cleanup completed")
         except Exception as e:
             print(f"[WARNING] Error during cleanup: {e}")
@@ -238,6 +356,8 @@ async def main():
                         help='Show full message content')
     parser.add_argument('--max-messages', '-m', type=int,
                         help='Maximum number of messages to display before stopping')
+    parser.add_argument('--hz', type=float,
+                        help='Display at most this many messages per second per topic (statistics still count all)')
     parser.add_argument('--duration', '-d', type=int, default=3,
                         help='Duration to scan for topics (list command only)')
 
@@ -246,7 +366,8 @@ async def main():
     # Create monitor instance
     monitor = TopicMonitor(
         zmq_endpoint=args.endpoint,
-        verbose=args.verbose
+        verbose=args.verbose,
+        display_hz=args.hz
     )
 
     try:
@@ -264,6 +385,6 @@ async def main():
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        run_main(main())
     except KeyboardInterrupt:
         print("\n[INFO] Interrupted by user")
@@ -275,6 +275,19 @@ export class WebSocketManager {
         try {
             const data = JSON.parse(event.data);
 
+            // The server coalesces messages that arrive close together into one array
+            if (Array.isArray(data)) {
+                data.forEach(item => this.handleData(item));
+            } else {
+                this.handleData(data);
+            }
+        } catch (error) {
+            Logger.error(`Message parsing error: ${error.message}`, error.stack);
+        }
+    }
+
+    handleData(data) {
+        try {
             // Check if this is a GeoJSON message
             if (this.isGeoJSONMessage(data)) {
                 this.processGeoJSONMessage(data);
@@ -295,7 +308,7 @@ export class WebSocketManager {
                 Logger.warn("Unknown message format received:", data);
             }
         } catch (error) {
-            Logger.error(`Message parsing error: ${error.message}`, error.stack);
+            Logger.error(`Message handling error: ${error.message}`, error.stack);
         }
     }
 